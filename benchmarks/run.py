@@ -0,0 +1,168 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# Times the full square noodles pipeline on synthetic trees of increasing size. Run it from the root of
+# the repo with:
+#
+#     python -m benchmarks.run --output results.json
+#     python -m benchmarks.run --baseline results.json
+#
+# The second form exits with a non-zero status if any case got slower than the baseline by more than
+# --threshold, so it can be used to catch regressions.
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from square_noodles import core
+from square_noodles.core import EditPlan
+from benchmarks.trees import SHAPES
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def run_once(tree):
+    timings = {}
+    start = time.perf_counter()
+    plan = core.square_noodles(tree.nodes, tree.links, timings=timings)
+    timings['total'] = time.perf_counter() - start
+    plan = plan if plan is not None else EditPlan()
+    counts = plan.counts()
+    counts.update(plan.stats.counts)
+    return timings, counts
+
+
+def peak_memory(tree):
+    tracemalloc.start()
+    core.square_noodles(tree.nodes, tree.links)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+# What auto square does on every edit, on an already squared tree: prime a LinkTracker, move every tenth
+# node and have it pick up the links that moved. This is the path the socket templates are used on
+# (whole-tree layouts go through SocketLayout instead), so their cache is emptied first and their stats
+# are for this alone.
+def track_once(tree):
+    core.socket_template.cache_clear()
+    tracker = core.LinkTracker()
+    start = time.perf_counter()
+    tracker.update(tree.nodes, tree.links)
+    primed = time.perf_counter()
+    for node in list(tree.nodes)[::10]:
+        node.location = (node.location.x + 20, node.location.y)
+    tracker.update(tree.nodes, tree.links)
+    timings = {'track_prime': primed - start, 'track_update': time.perf_counter() - primed}
+    return timings, core.socket_template_stats()
+
+
+def bench_case(shape, size, repeat):
+    make_tree = SHAPES[shape]
+    best = None
+    for r in range(repeat):
+        tree = make_tree(size)
+        timings, counts = run_once(tree)
+        if best is None or timings['total'] < best[0]['total']:
+            best = (timings, counts)
+    tree = make_tree(size)
+    result = {
+        'shape': shape,
+        'size': size,
+        'nodes': len(tree.nodes),
+        'links': len(tree.links),
+        'seconds': best[0],
+        'peak_memory_bytes': peak_memory(tree),
+    }
+    result.update(best[1])
+    track_timings, result['socket_templates'] = track_once(tree)
+    result['seconds'].update(track_timings)
+    return result
+
+
+def compare(results, baseline, threshold):
+    baseline_cases = {(r['shape'], r['size']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = baseline_cases.get((result['shape'], result['size']))
+        if old is None:
+            continue
+        ratio = result['seconds']['total'] / max(old['seconds']['total'], 1e-9)
+        if ratio > threshold:
+            regressions.append((result, ratio))
+        if result['reroutes_created'] != old['reroutes_created']:
+            print(f"note: {result['shape']}/{result['size']} now creates {result['reroutes_created']} reroutes "
+                  f"(baseline {old['reroutes_created']})")
+    return regressions
+
+
+def print_table(results):
+    phases = ['snapshot', 'index', 'layout', 'nudge', 'rewire', 'plan', 'apply', 'total', 'track_prime',
+              'track_update']
+    header = f"{'shape':<16}{'size':>7}{'links':>8}" + ''.join(f'{p + " ms":>12}' for p in phases) + \
+        f"{'peak MB':>10}{'reroutes':>10}{'moved':>7}{'+links':>8}{'-links':>8}{'templates':>11}{'hit rate':>10}"
+    print(header)
+    for r in results:
+        times = ''.join(f"{r['seconds'].get(p, 0.0) * 1000:>12.1f}" for p in phases)
+        print(f"{r['shape']:<16}{r['size']:>7}{r['links']:>8}{times}{r['peak_memory_bytes'] / 2**20:>10.2f}"
+              f"{r['reroutes_created']:>10}{r['reroutes_moved']:>7}{r['links_added']:>8}{r['links_removed']:>8}"
+              f"{r['socket_templates']['size']:>11}{r['socket_templates']['hit_rate']:>10.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark square noodles on synthetic node trees.')
+    parser.add_argument('--shapes', nargs='+', choices=sorted(SHAPES), default=list(SHAPES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case, the fastest one is kept.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare against results previously written with --output.')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='How many times slower than the baseline a case may get before it counts as a regression.')
+    args = parser.parse_args(argv)
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            results.append(bench_case(shape, size, args.repeat))
+
+    print_table(results)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for result, ratio in regressions:
+            print(f"REGRESSION: {result['shape']}/{result['size']} is {ratio:.2f}x slower than the baseline")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# Generators for synthetic node trees to benchmark against. Every generator takes the number of nodes
+# to make and a seed, and returns a MockTree with every node selected, as if the user had hit select
+# all before running the operator. Positions are jittered so that most links start out off-axis.
+
+import math
+import random
+
+from square_noodles.mock import MockTree
+
+NODE_WIDTH = 140.0
+SOCKET_HEIGHT = 22.0
+HEADER_HEIGHT = 35.0
+COLLAPSED_HEIGHT = 20.0
+
+
+def add_node(tree, x, y, n_inputs=2, n_outputs=1, hide=False, bl_idname='ShaderNodeMath'):
+    height = COLLAPSED_HEIGHT if hide else HEADER_HEIGHT + SOCKET_HEIGHT * (n_inputs + n_outputs) + 10.0
+    node = tree.nodes.new(bl_idname, location=(x, y), dimensions=(NODE_WIDTH, height), hide=hide, select=True)
+    for i in range(n_inputs):
+        node.add_input(f'Input_{i}')
+    for o in range(n_outputs):
+        node.add_output(f'Output_{o}')
+    return node
+
+
+def add_reroute(tree, x, y):
+    node = tree.nodes.new('NodeReroute', location=(x, y))
+    node.select = True
+    return node
+
+
+# A single long row of nodes, each one feeding the next.
+def chain(size, seed=0):
+    rng = random.Random(seed)
+    tree = MockTree('chain')
+    previous = None
+    for i in range(size):
+        node = add_node(tree, i * 220.0, rng.uniform(-80.0, 80.0))
+        if previous is not None:
+            tree.links.new(previous.outputs[0], node.inputs[0])
+        previous = node
+    return tree
+
+
+# Groups of one source node driving a tall column of up to 99 target nodes each.
+def fanout(size, seed=0):
+    rng = random.Random(seed)
+    tree = MockTree('fanout')
+    group_size = 100
+    for group_start in range(0, size, group_size):
+        group_y = -(group_start // group_size) * group_size * 120.0
+        targets = min(group_size, size - group_start) - 1
+        source = add_node(tree, 0.0, group_y - targets * 60.0, n_inputs=0, n_outputs=2)
+        for t in range(targets):
+            target = add_node(tree, 400.0 + rng.uniform(0.0, 200.0), group_y - t * 120.0)
+            tree.links.new(source.outputs[t % 2], target.inputs[0])
+    return tree
+
+
+# A square grid of collapsed nodes, each linked to its right-hand and lower-right neighbours.
+def collapsed_grid(size, seed=0):
+    rng = random.Random(seed)
+    tree = MockTree('collapsed_grid')
+    columns = max(1, math.ceil(math.sqrt(size)))
+    grid = {}
+    for i in range(size):
+        row, col = divmod(i, columns)
+        grid[row, col] = add_node(tree, col * 200.0, -row * 60.0 + rng.uniform(-15.0, 15.0), hide=True)
+    for (row, col), node in grid.items():
+        right = grid.get((row, col + 1))
+        if right is not None:
+            tree.links.new(node.outputs[0], right.inputs[0])
+        diagonal = grid.get((row + 1, col + 1))
+        if diagonal is not None:
+            tree.links.new(node.outputs[0], diagonal.inputs[1])
+    return tree
+
+
+# Rows of nodes joined through pairs of slightly misplaced reroutes, so that about two thirds of
+# the tree is reroutes the nudge pass has to line up.
+def reroute_heavy(size, seed=0):
+    rng = random.Random(seed)
+    tree = MockTree('reroute_heavy')
+    row_length = 30
+    made = 0
+    row = 0
+    while made < size:
+        y = -row * 300.0
+        previous = add_node(tree, 0.0, y)
+        made += 1
+        x = 0.0
+        while made < size and x < row_length * 200.0:
+            x += 200.0
+            a = add_reroute(tree, x + rng.uniform(-40.0, 40.0), y - 40.0 + rng.uniform(-40.0, 40.0))
+            b = add_reroute(tree, x + 100.0 + rng.uniform(-40.0, 40.0), y - 40.0 + rng.uniform(-40.0, 40.0))
+            tree.links.new(previous.outputs[0], a.inputs[0])
+            tree.links.new(a.outputs[0], b.inputs[0])
+            made += 2
+            if made >= size:
+                break
+            x += 200.0
+            node = add_node(tree, x, y + rng.uniform(-60.0, 60.0))
+            tree.links.new(b.outputs[0], node.inputs[0])
+            made += 1
+            previous = node
+        row += 1
+    return tree
+
+
+SHAPES = {
+    'chain': chain,
+    'fanout': fanout,
+    'collapsed_grid': collapsed_grid,
+    'reroute_heavy': reroute_heavy,
+}
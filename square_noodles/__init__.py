@@ -0,0 +1,34 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+bl_info = {
+    "name": "Square Noodles",
+    "description": "Forces selected node noodles to use exclusively right angle turns",
+    "author": "Kai Christensen",
+    "version": (1, 1),
+    "blender": (3, 2, 0),
+    "doc_url": "https://github.com/mkaic/square-noodles",
+    "support": "COMMUNITY",
+    "category": "Node",
+}
+
+# Blender loads the addon through register()/unregister() below. Outside of Blender there is no bpy, but
+# core.py and mock.py can still be imported on their own, e.g. to run or time the planner headless.
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if bpy is not None:
+    from .blender import register, unregister
@@ -0,0 +1,675 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+import cProfile
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import bpy
+from bpy.app.handlers import persistent
+from bpy_extras.io_utils import ExportHelper
+from . import core
+from .graph import save_graph
+from .mock import copy_tree
+
+# The thin Blender-facing side of the addon: it finds the tree being edited, reads the settings that
+# live in bpy, and hands the tree over to core.py, which does all the actual work.
+
+# Properties older versions of the addon registered on every node and socket to keep track of things
+# while routing. Files saved with them still carry a value for each one on every node they touched.
+STALE_PROPERTIES = ('is_reroute', 'x_lock', 'y_lock', 'center_offset')
+
+
+def get_active_tree(context):
+    tree = context.space_data.node_tree
+    path = []
+    # Get nodes from currently edited tree.
+    # If user is editing a group, space_data.node_tree is still the base level (outside group).
+    # context.active_node is in the group though, so if space_data.node_tree.nodes.active is not
+    # the same as context.active_node, the user is in a group.
+    # Check recursively until we find the real active node_tree:
+    if tree.nodes.active:
+        while tree.nodes.active != context.active_node:
+            tree = tree.nodes.active.node_tree
+            path.append(tree)
+    return tree, path
+
+
+def get_nodes_links(context):
+    tree, path = get_active_tree(context)
+    return tree.nodes, tree.links
+
+
+# Every editable node tree in the file, each one exactly once: the trees embedded in materials, worlds,
+# lights, textures, line styles and the compositor, followed by the node groups. Groups are datablocks
+# of their own, so a group used by a hundred materials still only comes up once. Trees linked in from
+# another file can't be edited and are skipped.
+def iter_node_trees(data):
+    owners = [*data.materials, *data.worlds, *data.lights, *data.textures, *data.linestyles, *data.scenes]
+    seen = set()
+    for owner in owners:
+        tree = getattr(owner, 'node_tree', None)
+        if tree is None or owner.library is not None or tree.as_pointer() in seen:
+            continue
+        seen.add(tree.as_pointer())
+        yield tree
+    for tree in data.node_groups:
+        if tree.library is None and tree.as_pointer() not in seen:
+            seen.add(tree.as_pointer())
+            yield tree
+
+
+class SquareNoodlesPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    write_profile: bpy.props.BoolProperty(name="Write Profile",
+                                          description="Profile every run of the operators and save it as a .pstats file that can be attached to bug reports.",
+                                          default=False)
+    profile_dir: bpy.props.StringProperty(name="Profile Folder",
+                                          description="Where to save profiles. Left empty, they go in the system's temporary folder.",
+                                          subtype='DIR_PATH',
+                                          default="")
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "write_profile")
+        row = layout.row()
+        row.active = self.write_profile
+        row.prop(self, "profile_dir")
+
+
+# A profiler to run the operator under if the Write Profile preference is on, otherwise None
+def new_profiler(context):
+    prefs = context.preferences.addons[__package__].preferences
+    return cProfile.Profile() if prefs.write_profile else None
+
+
+# Profiles the body, if there's a profiler. A modal run goes through this once per tick with the same one.
+@contextmanager
+def profiled(profiler):
+    if profiler is None:
+        yield
+        return
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+
+# Saves what the profiler picked up as a .pstats file and returns its path, or None if there's no profiler
+def save_profile(context, profiler):
+    if profiler is None:
+        return None
+    prefs = context.preferences.addons[__package__].preferences
+    folder = bpy.path.abspath(prefs.profile_dir) if prefs.profile_dir else tempfile.gettempdir()
+    stamp = time.strftime('%Y%m%d_%H%M%S') + f'_{int(time.time() * 1000) % 1000:03d}'
+    path = os.path.join(folder, f'square_noodles_{stamp}.pstats')
+    profiler.dump_stats(path)
+    return path
+
+
+# Selections with at least this many links around them (see core.SelectionScope) are squared by the modal
+# version of the operator
+MODAL_MIN_LINKS = 2000
+# How long each timer tick of the modal version gets to work for before giving Blender back control
+TICK_SECONDS = 0.05
+# Events the modal version lets through to the node editor while it works
+NAVIGATION_EVENTS = {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM',
+                     'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE'}
+
+
+# What the last run of an operator got up to, for its redo panel to show. The redo panel draws a fresh
+# instance of the operator, so this can't live on self.
+last_run = {}
+
+
+def draw_last_run(layout):
+    if len(last_run) == 0:
+        return
+    box = layout.box()
+    col = box.column(align=True)
+    col.label(text="Last Run")
+    for phase, seconds in last_run['timings'].items():
+        col.label(text=f"{phase.capitalize()}: {seconds * 1000:.1f} ms")
+    col.separator()
+    for name, value in last_run['counts'].items():
+        col.label(text=f"{name.replace('_', ' ').capitalize()}: {value}")
+    for phase, key in last_run['skipped'][:5]:
+        col.label(text=f"Skipped in {phase}: {key}", icon='ERROR')
+    if last_run['profile'] is not None:
+        col.label(text=f"Profile: {last_run['profile']}")
+
+
+def plan_summary(counts):
+    return f"{counts['reroutes_created']} reroutes created, {counts['reroutes_moved']} moved, " \
+        f"{counts['reroutes_removed']} removed, {counts['links_removed']} links removed, " \
+        f"{counts['links_added']} added"
+
+
+# Deletes every value of STALE_PROPERTIES left on the nodes and sockets of the given trees, and returns how
+# many there were
+def strip_stale_properties(trees):
+    removed = 0
+    for tree in trees:
+        for node in tree.nodes:
+            for owner in [node, *node.inputs, *node.outputs]:
+                for key in STALE_PROPERTIES:
+                    if key in owner:
+                        del owner[key]
+                        removed += 1
+    return removed
+
+
+# Squares every node in every tree of the file. Each tree is snapshotted here with every node selected,
+# the snapshots are planned across a pool of worker processes, and each plan is applied back onto its
+# tree as soon as it arrives. Only the snapshots and the applies touch bpy, so only they happen here.
+# Returns the number of trees that changed and the summed-up counts of every plan.
+def square_all_trees(data, tolerance=5.0, nudge_limit=100.0, noodle_margin=20.0, ui_scale=1.0,
+                     compact=False, fan_out=False, workers=None, dry_run=False):
+    trees = list(iter_node_trees(data))
+    snapshots = [(i, copy_tree(tree.nodes, tree.links, name=tree.name, select_all=True))
+                 for i, tree in enumerate(trees)]
+
+    changed = 0
+    totals = core.EditPlan().counts()
+    totals.update(core.RunStats().counts)
+    for i, plan in core.plan_many(snapshots, workers=workers, tolerance=tolerance, nudge_limit=nudge_limit,
+                                  noodle_margin=noodle_margin, ui_scale=ui_scale, compact=compact,
+                                  fan_out=fan_out):
+        if plan is None:
+            continue
+        counts = plan.counts()
+        if not any(counts.values()):
+            continue
+        changed += 1
+        counts.update(plan.stats.counts)
+        for key, value in counts.items():
+            totals[key] += value
+        if not dry_run:
+            core.apply_plan(plan, trees[i].nodes, trees[i].links)
+    return changed, totals
+
+
+# Trees that get squared automatically as they're edited, keyed by tree.as_pointer(). Each one has the
+# settings auto squaring was turned on with, and a LinkTracker so that only the links that changed since
+# last time get squared.
+auto_trees = {}
+auto_state = {'last_change': 0.0, 'waiting': False}
+# How long a tree has to go without changing before it's squared, so it doesn't happen in the middle of
+# dragging a node around
+AUTO_DELAY = 0.3
+# The kinds of datablock whose updates might mean a node tree was edited
+AUTO_ID_TYPES = ('NODETREE', 'MATERIAL', 'WORLD', 'LIGHT', 'TEXTURE', 'LINESTYLE', 'SCENE')
+
+
+def auto_square(tree, settings):
+    tracker = settings['tracker']
+    moved = tracker.update(tree.nodes, tree.links)
+    if len(moved) == 0:
+        return
+    plan = core.plan_square_noodles(tree.nodes, tree.links,
+                                    tolerance=settings['tolerance'],
+                                    nudge_limit=settings['nudge_limit'],
+                                    noodle_margin=settings['noodle_margin'],
+                                    ui_scale=tracker.ui_scale,
+                                    compact=settings['compact'],
+                                    fan_out=settings['fan_out'],
+                                    only_links=moved)
+    if (plan is not None) and any(plan.counts().values()):
+        core.apply_plan(plan, tree.nodes, tree.links)
+        # Nothing pushes an undo step for changes made from a timer, so without one undoing the next edit
+        # would take this squaring away with it
+        push_undo_step('Auto Square Noodles')
+        # Take note of our own changes, so they don't count as edits next time
+        tracker.update(tree.nodes, tree.links)
+
+
+# A timer callback has no window or screen in its context, which ed.undo_push needs, so it's borrowed
+# from the first open window. If there's none, or it still can't push, the squaring stays without an undo
+# step of its own rather than raising after it's already been applied.
+def push_undo_step(message):
+    window = next(iter(bpy.context.window_manager.windows), None)
+    if window is None:
+        return False
+    with bpy.context.temp_override(window=window, screen=window.screen):
+        if not bpy.ops.ed.undo_push.poll():
+            return False
+        bpy.ops.ed.undo_push(message=message)
+    return True
+
+
+# Timer callback: waits until nothing has changed for AUTO_DELAY, then squares whatever changed
+def auto_square_trees():
+    wait = AUTO_DELAY - (time.perf_counter() - auto_state['last_change'])
+    if wait > 0:
+        return wait
+    auto_state['waiting'] = False
+    for tree in iter_node_trees(bpy.data):
+        settings = auto_trees.get(tree.as_pointer())
+        if settings is not None:
+            auto_square(tree, settings)
+    return None
+
+
+@persistent
+def auto_square_handler(scene, depsgraph):
+    if len(auto_trees) == 0:
+        return
+    if not any(depsgraph.id_type_updated(id_type) for id_type in AUTO_ID_TYPES):
+        return
+    auto_state['last_change'] = time.perf_counter()
+    if not auto_state['waiting']:
+        auto_state['waiting'] = True
+        bpy.app.timers.register(auto_square_trees, first_interval=AUTO_DELAY)
+
+
+# Undo and redo put a tree back the way it was without anyone editing it, so the trackers take note of
+# the tree as it is now and forget what it looks like changed. Otherwise undoing an auto square would
+# look like the noodles it squared had just been moved back, and they'd be squared again straight away.
+@persistent
+def auto_square_undo(*args):
+    for tree in iter_node_trees(bpy.data):
+        settings = auto_trees.get(tree.as_pointer())
+        if settings is not None:
+            settings['tracker'].update(tree.nodes, tree.links)
+
+
+# Pointers mean nothing once another file is loaded. Timers don't survive loading a file either, so one
+# that was pending is gone and the handler has to be able to register a new one.
+@persistent
+def auto_square_reset(*args):
+    auto_trees.clear()
+    if bpy.app.timers.is_registered(auto_square_trees):
+        bpy.app.timers.unregister(auto_square_trees)
+    auto_state['waiting'] = False
+
+
+# The settings every squaring operator shares, so they only need describing once
+class SquareNoodlesSettings:
+
+    tolerance: bpy.props.FloatProperty(name="Tolerance",
+                                       description="How off-axis a noodle must be before it is operated on.",
+                                       default=5.0,
+                                       min=1.0,
+                                       max=25.0)
+    nudge_limit: bpy.props.FloatProperty(name="Nudge Limit",
+                                         description="Maximum distance existing reroute nodes will be nudged to try to align them before adding new reroute nodes.",
+                                         default=100.0,
+                                         min=0.0,
+                                         max=200)
+    noodle_margin: bpy.props.FloatProperty(name="Noodle Margin",
+                                           description="Distance which overlapping noodles from different node outputs will hopefully be separated by.",
+                                           default=20,
+                                           min=0,
+                                           max=100)
+    compact: bpy.props.BoolProperty(name="Compact Reroutes",
+                                     description="Afterwards, remove reroutes that sit in the middle of a straight noodle and merge ones stacked on the same trunk.",
+                                     default=False)
+    fan_out: bpy.props.BoolProperty(name="Shared Trunks",
+                                    description="Give each output that feeds several inputs one vertical trunk with a branch per input, instead of a separate stairstep for each.",
+                                    default=False)
+
+
+class NODE_OT_square_noodles(bpy.types.Operator, SquareNoodlesSettings):
+
+    # Metadata class variables used by Blender to construct the operator's F3 menu button
+    bl_idname = "node.square_noodles"
+    bl_label = "Square Noodles"
+    bl_description = \
+        "Forces all non-locked noodles connect to selected nodes to be \
+        straight lines with right-angle connections where necessary"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    dry_run: bpy.props.BoolProperty(name="Dry Run",
+                                    description="Work out what would change and report it without touching the node tree.",
+                                    default=False)
+
+    # The poll classmethod is called by Blender to determine whether the operator can be used in a given context. In our case,
+    # we don't want it to be possible to use the operator outside of a Node Editor because we'd get an error if we tried that.
+    @classmethod
+    def poll(cls, context):
+        space_data = context.space_data
+        status = (space_data.type == 'NODE_EDITOR') and (space_data.node_tree is not None)
+        return status
+
+    # The function that's run when you click on the operator in the menu, or when it's redone from the
+    # F9 panel. Everything happens in one go.
+    def execute(self, context):
+
+        global_nodes, global_links = get_nodes_links(context)
+        return self.square(context, global_nodes, global_links, core.SelectionScope(global_nodes, global_links))
+
+    # Everything execute does once the part of the tree around the selection has been found
+    def square(self, context, global_nodes, global_links, scope):
+
+        profiler = new_profiler(context)
+
+        with profiled(profiler):
+            # Work out every change up front from a snapshot of the tree, nothing gets touched yet
+            plan = core.plan_square_noodles(global_nodes, global_links,
+                                            tolerance=self.tolerance,
+                                            nudge_limit=self.nudge_limit,
+                                            noodle_margin=self.noodle_margin,
+                                            ui_scale=context.preferences.view.ui_scale,
+                                            compact=self.compact,
+                                            fan_out=self.fan_out,
+                                            scope=scope)
+
+        return self.finish(context, plan, global_nodes, global_links, scope, profiler)
+
+    # Applies a finished plan (unless it's a dry run) and reports on it
+    def finish(self, context, plan, global_nodes, global_links, scope, profiler):
+
+        last_run.clear()
+        if plan is None:
+            save_profile(context, profiler)
+            self.report({'WARNING'}, 'No nodes selected')
+            return {'CANCELLED'}
+
+        if not self.dry_run:
+            with profiled(profiler):
+                # If snapping is on, turn it off. If it was on we'll turn it back on when we're done.
+                snapping_on = context.tool_settings.use_snap_node
+                if snapping_on:
+                    context.tool_settings.use_snap_node = False
+
+                core.apply_plan(plan, global_nodes, global_links, plan.timings, scope)
+
+                # If the user had snapping on before, turn it back on.
+                if snapping_on:
+                    context.tool_settings.use_snap_node = True
+
+        profile_path = save_profile(context, profiler)
+        counts = plan.counts()
+        counts.update(plan.stats.counts)
+        last_run.update(timings=dict(plan.timings), counts=counts, skipped=list(plan.stats.skipped),
+                        profile=profile_path)
+
+        total = sum(plan.timings.values()) * 1000
+        prefix = 'Dry run: ' if self.dry_run else ''
+        self.report({'INFO'}, f'{prefix}{plan_summary(counts)} ({total:.0f} ms)')
+        if len(plan.stats.skipped) > 0:
+            for phase, key in plan.stats.skipped:
+                print(f'Square Noodles skipped a socket in {phase}: {key}')
+            self.report({'WARNING'}, f'{len(plan.stats.skipped)} sockets skipped, see the console')
+        if profile_path is not None:
+            self.report({'INFO'}, f'Profile saved to {profile_path}')
+        return {'FINISHED'}
+
+    # Run from the menu or the shortcut. Big selections are squared by the modal below a little at a time,
+    # so Blender stays responsive, shows how far along it is and can be stopped with Esc. Smaller ones are
+    # over too quickly for that to be worth it and just go through execute. Only the links around the
+    # selection count, since planning only looks at that part of the tree however big the rest is. The
+    # tree is read once to find them, and both ways plan and apply from what was read.
+    def invoke(self, context, event):
+
+        global_nodes, global_links = get_nodes_links(context)
+        scope = core.SelectionScope(global_nodes, global_links)
+        if len(scope.links) < MODAL_MIN_LINKS:
+            return self.square(context, global_nodes, global_links, scope)
+
+        self._nodes, self._links, self._scope = global_nodes, global_links, scope
+        self._profiler = new_profiler(context)
+        # Planning the same way execute does, so the result is the same, just a Progress at a time
+        self._steps = core.iter_plan_square_noodles(global_nodes, global_links,
+                                                    tolerance=self.tolerance,
+                                                    nudge_limit=self.nudge_limit,
+                                                    noodle_margin=self.noodle_margin,
+                                                    ui_scale=context.preferences.view.ui_scale,
+                                                    compact=self.compact,
+                                                    fan_out=self.fan_out,
+                                                    scope=scope)
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 100)
+        context.workspace.status_text_set('Squaring noodles... (Esc to cancel)')
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+
+        if event.type == 'ESC':
+            self.stop(context)
+            # Nothing has touched the tree yet, all the work so far was on a snapshot of it
+            self.report({'INFO'}, 'Square Noodles cancelled, nothing was changed')
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            # The view can be moved around while it works, but nothing that could change the tree under it
+            return {'PASS_THROUGH'} if event.type in NAVIGATION_EVENTS else {'RUNNING_MODAL'}
+
+        deadline = time.perf_counter() + TICK_SECONDS
+        # The tick can be used up before a single step runs, leaving nothing new to show
+        progress = None
+        with profiled(self._profiler):
+            try:
+                while time.perf_counter() < deadline:
+                    progress = next(self._steps)
+            except StopIteration as finished:
+                self.stop(context)
+                return self.finish(context, finished.value, self._nodes, self._links, self._scope, self._profiler)
+
+        if progress is not None and progress.phase == 'rewire':
+            context.window_manager.progress_update(100 * progress.done // progress.total)
+            context.workspace.status_text_set(
+                f'Squaring noodles: {progress.done}/{progress.total} nodes (Esc to cancel)')
+        return {'RUNNING_MODAL'}
+
+    def stop(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        self._steps.close()
+
+    def draw(self, context):
+        layout = self.layout
+        for prop in ('tolerance', 'nudge_limit', 'noodle_margin', 'compact', 'fan_out', 'dry_run'):
+            layout.prop(self, prop)
+        draw_last_run(layout)
+
+
+class NODE_OT_square_noodles_all(bpy.types.Operator, SquareNoodlesSettings):
+
+    bl_idname = "node.square_noodles_all"
+    bl_label = "Square Noodles (All Trees)"
+    bl_description = \
+        "Squares every noodle in every node tree of the file: materials, worlds, lights, textures, \
+        the compositor and all node groups"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    workers: bpy.props.IntProperty(name="Worker Processes",
+                                   description="How many processes to plan trees in at once. 0 uses one per CPU core.",
+                                   default=0,
+                                   min=0,
+                                   max=64)
+    dry_run: bpy.props.BoolProperty(name="Dry Run",
+                                    description="Work out what would change and report it without touching any node tree.",
+                                    default=False)
+
+    def execute(self, context):
+
+        snapping_on = context.tool_settings.use_snap_node
+        if snapping_on:
+            context.tool_settings.use_snap_node = False
+
+        profiler = new_profiler(context)
+        start = time.perf_counter()
+        with profiled(profiler):
+            changed, totals = square_all_trees(bpy.data,
+                                               tolerance=self.tolerance,
+                                               nudge_limit=self.nudge_limit,
+                                               noodle_margin=self.noodle_margin,
+                                               ui_scale=context.preferences.view.ui_scale,
+                                               compact=self.compact,
+                                               fan_out=self.fan_out,
+                                               workers=self.workers or None,
+                                               dry_run=self.dry_run)
+        total = (time.perf_counter() - start) * 1000
+
+        if snapping_on:
+            context.tool_settings.use_snap_node = True
+
+        prefix = 'Dry run: ' if self.dry_run else ''
+        self.report({'INFO'}, f'{prefix}{changed} trees, {plan_summary(totals)} ({total:.0f} ms)')
+        if totals['key_errors'] > 0:
+            self.report({'WARNING'}, f"{totals['key_errors']} sockets skipped")
+        profile_path = save_profile(context, profiler)
+        if profile_path is not None:
+            self.report({'INFO'}, f'Profile saved to {profile_path}')
+        return {'FINISHED'}
+
+
+class NODE_OT_square_noodles_auto(bpy.types.Operator, SquareNoodlesSettings):
+
+    bl_idname = "node.square_noodles_auto"
+    bl_label = "Auto Square Noodles"
+    bl_description = \
+        "Turns automatically squaring the noodles in this node tree as it's edited on or off. Only links \
+        that are new or that have an end that moved get squared"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        space_data = context.space_data
+        return (space_data.type == 'NODE_EDITOR') and (space_data.node_tree is not None)
+
+    def execute(self, context):
+        tree, path = get_active_tree(context)
+        key = tree.as_pointer()
+
+        if key in auto_trees:
+            del auto_trees[key]
+            self.report({'INFO'}, f'Auto square off for {tree.name}')
+            return {'FINISHED'}
+
+        # Only what changes from here on gets squared, the tree is left as it is for now
+        tracker = core.LinkTracker(context.preferences.view.ui_scale)
+        tracker.update(tree.nodes, tree.links)
+        auto_trees[key] = {'tracker': tracker,
+                           'tolerance': self.tolerance,
+                           'nudge_limit': self.nudge_limit,
+                           'noodle_margin': self.noodle_margin,
+                           'compact': self.compact,
+                           'fan_out': self.fan_out}
+        self.report({'INFO'}, f'Auto square on for {tree.name}')
+        return {'FINISHED'}
+
+
+class NODE_OT_square_noodles_export(bpy.types.Operator, ExportHelper):
+
+    bl_idname = "node.square_noodles_export"
+    bl_label = "Export Node Graph"
+    bl_description = \
+        "Saves this node tree as a JSON graph file that square noodles can plan without Blender, \
+        see python -m square_noodles.cli"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    all_trees: bpy.props.BoolProperty(name="All Trees",
+                                      description="Save every node tree in the file instead, one file each, named after the tree.",
+                                      default=False)
+
+    @classmethod
+    def poll(cls, context):
+        space_data = context.space_data
+        return (space_data.type == 'NODE_EDITOR') and (space_data.node_tree is not None)
+
+    def execute(self, context):
+        if not self.all_trees:
+            tree, path = get_active_tree(context)
+            save_graph(self.filepath, tree.nodes, tree.links, tree.name, tree.bl_idname)
+            self.report({'INFO'}, f'Saved {tree.name} to {self.filepath}')
+            return {'FINISHED'}
+
+        stem = os.path.splitext(self.filepath)[0]
+        count = 0
+        # embedded trees are all called "Shader Nodetree" and the like, the number keeps the files apart
+        for count, tree in enumerate(iter_node_trees(bpy.data), 1):
+            name = bpy.path.clean_name(tree.name)
+            save_graph(f'{stem}_{count:04d}_{name}.json', tree.nodes, tree.links, tree.name, tree.bl_idname)
+        self.report({'INFO'}, f'Saved {count} trees to {os.path.dirname(self.filepath)}')
+        return {'FINISHED'}
+
+
+class NODE_OT_square_noodles_cleanup(bpy.types.Operator):
+
+    bl_idname = "node.square_noodles_cleanup"
+    bl_label = "Remove Old Square Noodles Data"
+    bl_description = \
+        "Strips the routing values older versions of Square Noodles stored on every node and socket \
+        from every node tree in the file, which makes it smaller and quicker to save and undo"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        removed = strip_stale_properties(iter_node_trees(bpy.data))
+        self.report({'INFO'}, f'Removed {removed} old values')
+        return {'FINISHED'}
+
+
+# store keymaps here to access after registration
+addon_keymaps = []
+
+
+def register():
+    bpy.utils.register_class(SquareNoodlesPreferences)
+    bpy.utils.register_class(NODE_OT_square_noodles)
+    bpy.utils.register_class(NODE_OT_square_noodles_all)
+    bpy.utils.register_class(NODE_OT_square_noodles_auto)
+    bpy.utils.register_class(NODE_OT_square_noodles_export)
+    bpy.utils.register_class(NODE_OT_square_noodles_cleanup)
+    bpy.app.handlers.depsgraph_update_post.append(auto_square_handler)
+    bpy.app.handlers.load_post.append(auto_square_reset)
+    bpy.app.handlers.undo_post.append(auto_square_undo)
+    bpy.app.handlers.redo_post.append(auto_square_undo)
+
+    # handle the keymap
+    wm = bpy.context.window_manager
+    kc = wm.keyconfigs.addon
+
+    # apparently the "name" field below is an enum with 190 options and they're not documented. Yeesh.
+    if kc:
+        km = kc.keymaps.new(name='Node Editor', space_type='NODE_EDITOR')
+
+    kmi = km.keymap_items.new(NODE_OT_square_noodles.bl_idname, 'COMMA', 'PRESS', ctrl=False, shift=True)
+
+    addon_keymaps.append((km, kmi))
+
+
+def unregister():
+
+    # handle the keymap
+    for km, kmi in addon_keymaps:
+        km.keymap_items.remove(kmi)
+    addon_keymaps.clear()
+
+    bpy.app.handlers.redo_post.remove(auto_square_undo)
+    bpy.app.handlers.undo_post.remove(auto_square_undo)
+    bpy.app.handlers.load_post.remove(auto_square_reset)
+    bpy.app.handlers.depsgraph_update_post.remove(auto_square_handler)
+    auto_square_reset()
+
+    bpy.utils.unregister_class(NODE_OT_square_noodles_cleanup)
+    bpy.utils.unregister_class(NODE_OT_square_noodles_export)
+    bpy.utils.unregister_class(NODE_OT_square_noodles_auto)
+    bpy.utils.unregister_class(NODE_OT_square_noodles_all)
+    bpy.utils.unregister_class(NODE_OT_square_noodles)
+    bpy.utils.unregister_class(SquareNoodlesPreferences)
+
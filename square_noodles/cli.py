@@ -0,0 +1,130 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# Plans square noodles for graph files (see graph.py) from the command line, no Blender needed:
+#
+#     python -m square_noodles.cli graphs/ --workers 8 --plans > plans.jsonl
+#
+# Directories are searched for .json files recursively. The files are loaded and planned in a pool of
+# worker processes, and one line of JSON per file is written out as soon as it's done, in whatever order
+# they finish: its counts, run stats and timings, and with --plans the whole plan. A file that can't be
+# read or planned gets a line with its error instead, and the exit status is 1 if there were any.
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from . import core
+from .core import EditPlan
+from .graph import load_graph
+
+
+def find_graphs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.json'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def plan_file(job):
+    path, settings, select_all, with_plan = job
+    result = {'file': path}
+    try:
+        start = time.perf_counter()
+        tree = load_graph(path, select_all)
+        load_seconds = time.perf_counter() - start
+        plan = core.plan_square_noodles(tree.nodes, tree.links, **settings)
+    except Exception as e:
+        # one bad file shouldn't take the rest of the batch down with it
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+    plan = plan if plan is not None else EditPlan()
+    result['nodes'] = len(tree.nodes)
+    result['links'] = len(tree.links)
+    result['counts'] = plan.counts()
+    result['stats'] = plan.stats.counts
+    result['seconds'] = dict(plan.timings, load=load_seconds)
+    if with_plan:
+        result['plan'] = plan.to_dict()
+        result['skipped'] = plan.stats.skipped
+    return result
+
+
+def write_results(results, out):
+    errors = 0
+    for result in results:
+        errors += 'error' in result
+        out.write(json.dumps(result, separators=(',', ':')) + '\n')
+        out.flush()
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m square_noodles.cli',
+                                     description='Square the noodles of node graphs saved as JSON.')
+    parser.add_argument('paths', nargs='+', help='graph files, or directories to search for .json files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes to plan with (default: one per CPU)')
+    parser.add_argument('--plans', action='store_true', help='write out the whole plan for each file')
+    parser.add_argument('--selected-only', action='store_true',
+                        help='only square what was selected when the graph was saved (default: everything)')
+    parser.add_argument('--output', default=None, help='write the JSON lines here instead of stdout')
+    parser.add_argument('--tolerance', type=float, default=5.0)
+    parser.add_argument('--nudge-limit', type=float, default=100.0)
+    parser.add_argument('--noodle-margin', type=float, default=20.0)
+    parser.add_argument('--ui-scale', type=float, default=1.0)
+    parser.add_argument('--compact', action='store_true', help='clean up redundant reroutes afterwards')
+    parser.add_argument('--fan-out', action='store_true', help='one shared trunk per output that feeds several inputs')
+    args = parser.parse_args(argv)
+
+    settings = {
+        'tolerance': args.tolerance,
+        'nudge_limit': args.nudge_limit,
+        'noodle_margin': args.noodle_margin,
+        'ui_scale': args.ui_scale,
+        'compact': args.compact,
+        'fan_out': args.fan_out,
+    }
+    jobs = [(path, settings, not args.selected_only, args.plans) for path in find_graphs(args.paths)]
+    workers = args.workers if args.workers is not None else (os.cpu_count() or 1)
+    workers = max(1, min(workers, len(jobs)))
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        if workers == 1:
+            errors = write_results(map(plan_file, jobs), out)
+        else:
+            # hand the files out a few at a time, thousands of tiny round trips add up
+            chunksize = max(1, min(16, len(jobs) // (workers * 4)))
+            with multiprocessing.Pool(workers) as pool:
+                errors = write_results(pool.imap_unordered(plan_file, jobs, chunksize), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f'{len(jobs)} graphs, {errors} errors, {time.perf_counter() - start:.2f}s with {workers} workers',
+          file=sys.stderr)
+    return 1 if errors > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1873 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# Everything in here works on anything shaped like a Blender node tree and never touches bpy itself, so
+# it can be run against the in-memory trees in mock.py without Blender. See blender.py for the operator.
+
+import functools
+import heapq
+import math
+import multiprocessing
+import os
+import platform
+import time
+import numpy as np
+from collections import namedtuple
+
+from .mock import add_outlines, copy_tree
+
+OS = platform.system()
+
+Socket = namedtuple('Socket', ['socket', 'direction', 'x', 'y'])
+Point = namedtuple('Point', ['x', 'y'])
+LinkEntry = namedtuple('LinkEntry', ['link', 'node', 'socket'])
+LinkRef = namedtuple('LinkRef', ['from_node', 'from_socket', 'to_node', 'to_socket'])
+NodeMove = namedtuple('NodeMove', ['name', 'x', 'y'])
+Progress = namedtuple('Progress', ['phase', 'done', 'total'])
+Channel = namedtuple('Channel', ['x', 'x_min', 'x_max', 'y_min', 'y_max', 'source', 'reroutes'])
+
+# Socket spacing in the node editor, in unscaled UI units
+Y_TOP = 35.0
+
+NORMAL_Y_BOTTOM = 17.0
+NORMAL_HEIGHT = 22.0
+
+VEC_Y_BOTTOM = 75
+VEC_HEIGHT = 82.5
+
+Y_CENTER_OFFSET = 10.0
+
+
+def socket_key(node, socket):
+    return (node.name, socket.identifier, 'output' if socket.is_output else 'input')
+
+
+class LinkIndex:
+
+    # NodeSocket.links and NodeSocket.is_linked walk the tree's entire link list every time they're read,
+    # which makes looking at every link of every socket quadratic in the number of links. Instead we index
+    # tree.links once, mapping (node name, socket identifier, direction) to the links on that socket along
+    # with the node and socket at the other end of each one. Links have to be created and removed through
+    # the index so that it stays in sync with the tree.
+
+    def __init__(self, links):
+        self.links = links
+        self.entries = {}
+        self.link_counts = {}
+        for link in links:
+            self._index(link)
+
+    def _index(self, link):
+        from_key = socket_key(link.from_node, link.from_socket)
+        to_key = socket_key(link.to_node, link.to_socket)
+        self.entries.setdefault(from_key, []).append(LinkEntry(link, link.to_node, link.to_socket))
+        self.entries.setdefault(to_key, []).append(LinkEntry(link, link.from_node, link.from_socket))
+        for node_name in (from_key[0], to_key[0]):
+            self.link_counts[node_name] = self.link_counts.get(node_name, 0) + 1
+
+    def _unindex(self, link, from_key, to_key):
+        for key in (from_key, to_key):
+            self.entries[key] = [e for e in self.entries[key] if e.link != link]
+            self.link_counts[key[0]] -= 1
+
+    # The links attached to a socket, as LinkEntry tuples of the link and the node and socket on the far end
+    def get(self, node, socket):
+        return tuple(self.entries.get(socket_key(node, socket), ()))
+
+    def is_linked(self, node, socket):
+        return len(self.entries.get(socket_key(node, socket), ())) > 0
+
+    def is_orphan(self, node):
+        return self.link_counts.get(node.name, 0) == 0
+
+    def new(self, from_socket, to_socket):
+        link = self.links.new(from_socket, to_socket)
+        to_key = socket_key(link.to_node, link.to_socket)
+        if not link.to_socket.is_multi_input:
+            # Blender throws away whatever was linked into a single input when a new link is made to it
+            for entry in [e for e in self.entries.get(to_key, []) if e.link != link]:
+                self._unindex(entry.link, socket_key(entry.node, entry.socket), to_key)
+        if not any(e.link == link for e in self.entries.get(to_key, [])):
+            self._index(link)
+        return link
+
+    def remove(self, link):
+        from_key = socket_key(link.from_node, link.from_socket)
+        to_key = socket_key(link.to_node, link.to_socket)
+        self.links.remove(link)
+        self._unindex(link, from_key, to_key)
+
+
+def is_orphan(node, link_index):
+    return link_index.is_orphan(node)
+
+# code for calculating socket positions is taken from a SO post by Markus von Broady
+
+
+# Worked out from the node itself every time rather than stored on it, so nothing the planner uses ends up
+# saved in the .blend
+def is_reroute(node):
+    return node.bl_idname == 'NodeReroute'
+
+
+def is_hidden(socket):
+    return socket.hide or not socket.enabled
+
+
+def is_tall(node, socket, link_index):
+    if socket.type != 'VECTOR':
+        return False
+    if socket.hide_value:
+        return False
+    if link_index.is_linked(node, socket):
+        return False
+    if node.type == 'BSDF_PRINCIPLED' and socket.identifier == 'Subsurface Radius':
+        return False  # an exception confirms a rule?
+    return True
+
+
+# A node's width and height in the same units as its location, from its node.dimensions. Works the same
+# on NumPy arrays of them.
+def true_dimensions(width, height, ui_scale=1.0, os_name=None):
+    if (os_name or OS) == 'Darwin':
+        # node.dimensions is mysteriously off by a factor of 2
+        width, height = width / 2, height / 2
+    return width / ui_scale, height / ui_scale
+
+
+# How many socket templates to keep around. Every distinct kind of node in a tree (type, size, which
+# sockets are showing) needs one, so this is plenty for even very big trees.
+TEMPLATE_CACHE_SIZE = 1024
+
+
+# Where every visible socket of a node sits relative to its location, for any node with the same type,
+# collapsed state, per-socket visibility (0 hidden, 1 showing, 2 showing and tall), dimensions, UI scale and
+# OS. Returns (inputs, outputs), each a tuple of (index into node.inputs/node.outputs, dx, dy) in the order
+# get_socket_dict fills them in. Hundreds of identical Math nodes all share one of these.
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def socket_template(bl_idname, hide, input_mask, output_mask, width, height, ui_scale, os_name):
+
+    node_width, node_height = true_dimensions(width, height, ui_scale, os_name)
+
+    inputs = []
+    outputs = []
+
+    if bl_idname == 'NodeReroute':
+        inputs = [(idx, 0.0, 0.0) for idx in range(len(input_mask))]
+        outputs = [(idx, 0.0, 0.0) for idx in range(len(output_mask))]
+
+    elif not hide:
+
+        # Walk up the inputs and store their positions (have to account for "tall" inputs)
+        x = 0.0
+        y = -node_height
+        counter = 0
+        for idx in reversed(range(len(input_mask))):
+
+            if input_mask[idx] == 0:
+                continue
+
+            tall = input_mask[idx] == 2
+
+            if (counter == 0) and (tall):
+                y += VEC_Y_BOTTOM
+            if (counter == 0) and (not tall):
+                y += NORMAL_Y_BOTTOM
+            if (counter != 0) and (tall):
+                y += VEC_HEIGHT
+            if (counter != 0) and (not tall):
+                y += NORMAL_HEIGHT
+
+            inputs.append((idx, x, y))
+            counter += 1
+
+        # Walk down the outputs and store their positions
+        x = node_width - 1.0
+        y = 0.0
+
+        counter = 0
+        for idx in range(len(output_mask)):
+            if output_mask[idx] == 0:
+                continue
+
+            if counter == 0:
+                y -= Y_TOP
+            if counter != 0:
+                y -= NORMAL_HEIGHT
+
+            outputs.append((idx, x, y))
+            counter += 1
+
+    # For when the node is collapsed with sockets arranged in a semicircle at either end
+    else:
+
+        radius = node_height/2
+        input_circle_center = Point(radius, -Y_CENTER_OFFSET)
+        output_circle_center = Point(node_width - radius, -Y_CENTER_OFFSET)
+
+        visible_inputs = [idx for idx in reversed(range(len(input_mask))) if input_mask[idx] != 0]
+        n_in = len(visible_inputs)
+        slice_angle = math.pi/(n_in+1)
+        for order, idx in enumerate(visible_inputs):
+
+            slice = order+1
+            start = 3*math.pi/2
+            x = input_circle_center.x + (math.cos(start-(slice*slice_angle))*radius)
+            y = input_circle_center.y + (math.sin(start-(slice*slice_angle))*radius)
+
+            inputs.append((idx, x, y))
+
+        visible_outputs = [idx for idx in range(len(output_mask)) if output_mask[idx] != 0]
+        n_out = len(visible_outputs)
+        slice_angle = math.pi/(n_out+1)
+        for order, idx in enumerate(visible_outputs):
+
+            slice = order+1
+            start = math.pi/2
+            x = output_circle_center.x + (math.cos(start-(slice*slice_angle))*radius)
+            y = output_circle_center.y + (math.sin(start-(slice*slice_angle))*radius)
+
+            outputs.append((idx, x, y))
+
+    return tuple(inputs), tuple(outputs)
+
+
+# How well the socket templates are being reused, for tuning TEMPLATE_CACHE_SIZE. Only get_socket_dict
+# uses them (LinkTracker, new reroutes, snapshot bounds), whole-tree layouts go through SocketLayout.
+def socket_template_stats():
+    info = socket_template.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups > 0 else 0.0,
+    }
+
+
+def get_socket_dict(node, link_index, ui_scale=1.0):
+
+    # Reroutes show all their sockets. Otherwise the only thing about each socket that matters to where
+    # they all end up is whether it's showing and, for an expanded node, whether it's tall.
+    if node.bl_idname == 'NodeReroute':
+        input_mask = (1,) * len(node.inputs)
+        output_mask = (1,) * len(node.outputs)
+    elif node.hide:
+        input_mask = tuple(0 if is_hidden(i) else 1 for i in node.inputs)
+        output_mask = tuple(0 if is_hidden(o) else 1 for o in node.outputs)
+    else:
+        input_mask = tuple(0 if is_hidden(i) else 2 if is_tall(node, i, link_index) else 1 for i in node.inputs)
+        output_mask = tuple(0 if is_hidden(o) else 1 for o in node.outputs)
+
+    width, height = node.dimensions
+    inputs, outputs = socket_template(node.bl_idname, node.hide, input_mask, output_mask, width, height, ui_scale, OS)
+
+    # Empty dict for holding input and output socket coordinates
+    socket_dict = {'input': {}, 'output': {}}
+
+    x, y = node.location
+    node_inputs = node.inputs
+    node_outputs = node.outputs
+    for idx, dx, dy in inputs:
+        socket = node_inputs[idx]
+        socket_dict['input'][socket.identifier] = Socket(socket, 'input', x + dx, y + dy)
+    for idx, dx, dy in outputs:
+        socket = node_outputs[idx]
+        socket_dict['output'][socket.identifier] = Socket(socket, 'output', x + dx, y + dy)
+
+    return socket_dict
+
+
+class SocketLayout:
+
+    # The same socket positions get_socket_dict works out, but for a whole tree at once and stored as a
+    # struct of arrays with one row per socket: node index, direction, x, y, and whether the socket is
+    # hidden. Gathering the per-socket flags still has to walk the sockets, but the positions
+    # themselves are computed with one batch of NumPy operations for each of the three layouts (expanded,
+    # collapsed into a semicircle, reroute). rows maps (node name, identifier, direction) to the row of
+    # every socket that has a position, i.e. every one get_socket_dict would have returned.
+
+    EXPANDED, COLLAPSED, REROUTE = 0, 1, 2
+    INPUT, OUTPUT = 0, 1
+    DIRECTIONS = ('input', 'output')
+
+    def __init__(self, nodes, link_index, ui_scale=1.0):
+        self.link_index = link_index
+        self.ui_scale = ui_scale
+
+        gathered = self._gather(nodes)
+        self.node_index = np.array(gathered['node_index'], dtype=np.int64)
+        self.direction = np.array(gathered['direction'], dtype=np.int8)
+        self.hidden = np.array(gathered['hidden'], dtype=bool)
+        self.x, self.y = self._positions(gathered)
+        self.sockets = gathered['sockets']
+
+        self.node_names = [node.name for node in nodes]
+        self.node_slices = {}
+        start = 0
+        for name, stop in zip(self.node_names, gathered['node_stops']):
+            self.node_slices[name] = slice(start, stop)
+            start = stop
+
+        self.rows = {}
+        for row in np.flatnonzero(~self.hidden).tolist():
+            socket = self.sockets[row]
+            node_name = self.node_names[self.node_index[row]]
+            self.rows[(node_name, socket.identifier, self.DIRECTIONS[self.direction[row]])] = row
+
+    def _gather(self, nodes):
+        gathered = {key: [] for key in ('node_index', 'direction', 'tall', 'hidden', 'rank', 'count', 'sockets',
+                                        'kind', 'location', 'dimensions', 'node_stops')}
+        for node_idx, node in enumerate(nodes):
+            if node.bl_idname == 'NodeReroute':
+                kind = self.REROUTE
+                inputs = node.inputs
+            else:
+                kind = self.COLLAPSED if node.hide else self.EXPANDED
+                inputs = list(reversed(node.inputs))
+            gathered['kind'].append(kind)
+            gathered['location'].append(tuple(node.location))
+            gathered['dimensions'].append(tuple(node.dimensions))
+
+            for direction, sockets in ((self.INPUT, inputs), (self.OUTPUT, node.outputs)):
+                rank = 0
+                for socket in sockets:
+                    hidden = (kind != self.REROUTE) and is_hidden(socket)
+                    tall = (kind == self.EXPANDED) and (direction == self.INPUT) and (not hidden) \
+                        and is_tall(node, socket, self.link_index)
+                    gathered['node_index'].append(node_idx)
+                    gathered['direction'].append(direction)
+                    gathered['hidden'].append(hidden)
+                    gathered['tall'].append(tall)
+                    gathered['rank'].append(-1 if hidden else rank)
+                    gathered['sockets'].append(socket)
+                    if not hidden:
+                        rank += 1
+                gathered['count'].extend([rank] * len(sockets))
+            gathered['node_stops'].append(len(gathered['sockets']))
+        return gathered
+
+    def _positions(self, gathered):
+        n_rows = len(gathered['sockets'])
+        x = np.full(n_rows, np.nan)
+        y = np.full(n_rows, np.nan)
+        if n_rows == 0:
+            return x, y
+
+        location = np.array(gathered['location'], dtype=np.float64).reshape(-1, 2)
+        dimensions = np.array(gathered['dimensions'], dtype=np.float64).reshape(-1, 2)
+        width, height = true_dimensions(dimensions[:, 0], dimensions[:, 1], self.ui_scale)
+
+        node_index = np.array(gathered['node_index'], dtype=np.int64)
+        direction = np.array(gathered['direction'], dtype=np.int8)
+        tall = np.array(gathered['tall'], dtype=bool)
+        hidden = np.array(gathered['hidden'], dtype=bool)
+        rank = np.array(gathered['rank'], dtype=np.int64)
+        count = np.array(gathered['count'], dtype=np.int64)
+        kind = np.array(gathered['kind'], dtype=np.int8)[node_index]
+
+        node_x = location[node_index, 0]
+        node_y = location[node_index, 1]
+        node_width = width[node_index]
+        node_height = height[node_index]
+        visible = ~hidden
+        inputs = direction == self.INPUT
+        outputs = direction == self.OUTPUT
+
+        # Expanded nodes: inputs stack up from the bottom of the node (tall vector inputs take up more room),
+        # outputs stack down from the header.
+        m = visible & (kind == self.EXPANDED) & inputs
+        if m.any():
+            first = rank[m] == 0
+            steps = np.where(first,
+                             np.where(tall[m], VEC_Y_BOTTOM, NORMAL_Y_BOTTOM),
+                             np.where(tall[m], VEC_HEIGHT, NORMAL_HEIGHT))
+            climbed = np.cumsum(steps)
+            # Turn the running total over every node into a running total within each node
+            group = np.cumsum(first) - 1
+            climbed = climbed - (climbed - steps)[first][group]
+            x[m] = node_x[m]
+            y[m] = node_y[m] - node_height[m] + climbed
+
+        m = visible & (kind == self.EXPANDED) & outputs
+        x[m] = node_x[m] + node_width[m] - 1.0
+        y[m] = node_y[m] - (Y_TOP + NORMAL_HEIGHT * rank[m])
+
+        # Collapsed nodes: sockets are spread around a semicircle at either end
+        radius = node_height / 2
+        slice_angle = np.pi / (count + 1)
+        m = visible & (kind == self.COLLAPSED) & inputs
+        angle = 3*np.pi/2 - (rank[m] + 1) * slice_angle[m]
+        x[m] = node_x[m] + radius[m] + np.cos(angle) * radius[m]
+        y[m] = node_y[m] - Y_CENTER_OFFSET + np.sin(angle) * radius[m]
+
+        m = visible & (kind == self.COLLAPSED) & outputs
+        angle = np.pi/2 - (rank[m] + 1) * slice_angle[m]
+        x[m] = node_x[m] + node_width[m] - radius[m] + np.cos(angle) * radius[m]
+        y[m] = node_y[m] - Y_CENTER_OFFSET + np.sin(angle) * radius[m]
+
+        # Reroutes: every socket sits right on the node's location
+        m = kind == self.REROUTE
+        x[m] = node_x[m]
+        y[m] = node_y[m]
+
+        return x, y
+
+    # Recomputes the rows of a node that has moved since the layout was built
+    def update(self, node):
+        rows = self.node_slices[node.name]
+        gathered = self._gather([node])
+        self.x[rows], self.y[rows] = self._positions(gathered)
+
+    # The layout of one node in the same nested dict format get_socket_dict returns
+    def socket_dict(self, node_name):
+        rows = self.node_slices[node_name]
+        socket_dict = {'input': {}, 'output': {}}
+        for row in range(rows.start, rows.stop):
+            if self.hidden[row]:
+                continue
+            direction = self.DIRECTIONS[self.direction[row]]
+            socket = self.sockets[row]
+            socket_dict[direction][socket.identifier] = Socket(socket, direction, float(self.x[row]), float(self.y[row]))
+        return socket_dict
+
+    # check_aligned for every link in one go. Returns a dict of link to whether it's aligned, leaving out
+    # any link with an end that doesn't have a position.
+    def aligned_links(self, links, tolerance):
+        links = list(links)
+        from_rows = np.array([self.rows.get(socket_key(l.from_node, l.from_socket), -1) for l in links],
+                             dtype=np.int64)
+        to_rows = np.array([self.rows.get(socket_key(l.to_node, l.to_socket), -1) for l in links],
+                           dtype=np.int64)
+        placed = (from_rows >= 0) & (to_rows >= 0)
+        from_rows, to_rows = from_rows[placed], to_rows[placed]
+        aligned = (np.abs(self.x[from_rows] - self.x[to_rows]) < tolerance) | \
+            (np.abs(self.y[from_rows] - self.y[to_rows]) < tolerance)
+        placed_links = [l for l, p in zip(links, placed) if p]
+        return dict(zip(placed_links, aligned.tolist()))
+
+
+class SocketCache:
+
+    # Hands out socket positions in the get_socket_dict format for the duration of a single operator
+    # run, keyed by node name. Nodes that were in the tree when the run started are read out of a
+    # SocketLayout the first time they're asked for. Rather than rebuilding everything when something
+    # changes, nodes that move are marked dirty and recomputed on refresh(), and nodes that get created
+    # are added as they appear.
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.socket_dicts = {}
+        self.dirty = set()
+
+    def __getitem__(self, node_name):
+        socket_dict = self.socket_dicts.get(node_name)
+        if socket_dict is None:
+            socket_dict = self.layout.socket_dict(node_name)
+            self.socket_dicts[node_name] = socket_dict
+        return socket_dict
+
+    def add(self, node):
+        self.socket_dicts[node.name] = get_socket_dict(node, self.layout.link_index, self.layout.ui_scale)
+
+    def invalidate(self, node):
+        self.dirty.add(node.name)
+
+    def refresh(self, nodes):
+        for node in nodes:
+            if node.name in self.dirty:
+                self.layout.update(node)
+                self.socket_dicts.pop(node.name, None)
+        self.dirty.clear()
+
+
+def check_aligned(socket_1, socket_2, tolerance):
+    x1, y1 = (socket_1.x, socket_1.y)
+    x2, y2 = (socket_2.x, socket_2.y)
+    return (abs(x1 - x2) < tolerance) or (abs(y1 - y2) < tolerance)
+
+
+def find_valid_nodes(nodes, link_index):
+    return [n for n in nodes if n.select and not is_orphan(n, link_index)]
+
+
+# The rectangle a node covers as (x_min, y_min, x_max, y_max), with the same corrections to its
+# dimensions that get_socket_dict makes. A node's location is its top left corner.
+def node_rect(node, ui_scale=1.0):
+    width, height = true_dimensions(*node.dimensions, ui_scale)
+    x, y = node.location
+    return (x, y - height, x + width, y)
+
+
+class NodeGrid:
+
+    # A uniform grid over the rectangles of every node a noodle shouldn't run underneath, which is all of
+    # them except reroutes and frames. Each cell lists the nodes that overlap it, so checking a straight
+    # segment only looks at the nodes in the cells it crosses instead of every node in the tree. The cells
+    # are about the size of a typical node unless cell_size says otherwise.
+
+    # How many middle x's best_middle_x tries on either side of halfway before giving up
+    MAX_DETOURS = 16
+    # Cells any smaller than this would only make checking a long segment look at a lot of empty cells
+    MIN_CELL_SIZE = 20.0
+
+    def __init__(self, nodes, ui_scale=1.0, cell_size=None):
+        self.names = []
+        self.rects = []
+        for node in nodes:
+            if node.bl_idname in ('NodeReroute', 'NodeFrame'):
+                continue
+            rect = node_rect(node, ui_scale)
+            # Blender gives nodes that have never been drawn zero dimensions. There's nothing of them
+            # to run underneath, so they're left out.
+            if rect[2] <= rect[0] or rect[3] <= rect[1]:
+                continue
+            self.names.append(node.name)
+            self.rects.append(rect)
+
+        if cell_size is None:
+            sizes = np.array(self.rects, dtype=np.float64).reshape(-1, 4)
+            sizes = np.maximum(sizes[:, 2] - sizes[:, 0], sizes[:, 3] - sizes[:, 1])
+            cell_size = float(np.median(sizes)) if len(sizes) > 0 else 200.0
+        self.cell_size = max(cell_size, self.MIN_CELL_SIZE)
+
+        self.cells = {}
+        for idx, (x_min, y_min, x_max, y_max) in enumerate(self.rects):
+            for i in range(self.cell(x_min), self.cell(x_max) + 1):
+                for j in range(self.cell(y_min), self.cell(y_max) + 1):
+                    self.cells.setdefault((i, j), []).append(idx)
+
+    def cell(self, coordinate):
+        return math.floor(coordinate / self.cell_size)
+
+    # Whether the straight line from start to end passes through any node not named in ignore. Touching
+    # the edge of a node doesn't count.
+    def segment_blocked(self, start, end, ignore=()):
+        x_min, x_max = min(start[0], end[0]), max(start[0], end[0])
+        y_min, y_max = min(start[1], end[1]), max(start[1], end[1])
+        seen = set()
+        for i in range(self.cell(x_min), self.cell(x_max) + 1):
+            for j in range(self.cell(y_min), self.cell(y_max) + 1):
+                for idx in self.cells.get((i, j), ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+                    rect = self.rects[idx]
+                    if (x_min < rect[2]) and (x_max > rect[0]) and (y_min < rect[3]) and (y_max > rect[1]) \
+                            and (self.names[idx] not in ignore):
+                        return True
+        return False
+
+    # How many of the segments of a path of right-angled segments through points run under a node
+    def path_blocked(self, points, ignore=()):
+        return sum(self.segment_blocked(a, b, ignore) for a, b in zip(points, points[1:]))
+
+    # The middle x for a stairstep between root and target (sideways, up/down, sideways) that runs under
+    # as few nodes as possible, trying x's step apart and preferring ones closer to halfway. Returns the
+    # x and how many of the three segments are still blocked there.
+    def best_middle_x(self, root, target, step, ignore=()):
+        average = (root.x + target.x) / 2
+        low, high = min(root.x, target.x), max(root.x, target.x)
+
+        def candidates():
+            yield average
+            for k in range(1, self.MAX_DETOURS + 1):
+                for x in (average - k * step, average + k * step):
+                    if low < x < high:
+                        yield x
+
+        best = None
+        for x in candidates():
+            blocked = self.path_blocked([root, (x, root.y), (x, target.y), target], ignore)
+            if best is None or blocked < best[1]:
+                best = (x, blocked)
+            if blocked == 0:
+                break
+        return best
+
+    # How far either side of x the middle of a stairstep between root and target can be moved without
+    # running under any node it doesn't already run under at x, looking no further than reach either way.
+    # Returns the range as (x_min, x_max), which never goes past either end.
+    def clear_range(self, root, target, x, reach, ignore=()):
+        x_min, x_max = max(min(root.x, target.x), x - reach), min(max(root.x, target.x), x + reach)
+        y_min, y_max = min(root.y, target.y), max(root.y, target.y)
+        seen = set()
+        for i in range(self.cell(x_min), self.cell(x_max) + 1):
+            for j in range(self.cell(y_min), self.cell(y_max) + 1):
+                for idx in self.cells.get((i, j), ()):
+                    if idx in seen or self.names[idx] in ignore:
+                        continue
+                    seen.add(idx)
+                    rect_x_min, rect_y_min, rect_x_max, rect_y_max = self.rects[idx]
+                    # A node beside the vertical segment, or level with a sideways one that heads towards
+                    # it, is as far as the middle can go that way
+                    vertical = y_min < rect_y_max and y_max > rect_y_min
+                    if rect_x_min >= x and (vertical or any(end.x <= x and rect_y_min < end.y < rect_y_max
+                                                            for end in (root, target))):
+                        x_max = min(x_max, rect_x_min)
+                    if rect_x_max <= x and (vertical or any(end.x >= x and rect_y_min < end.y < rect_y_max
+                                                            for end in (root, target))):
+                        x_min = max(x_min, rect_x_max)
+        return x_min, x_max
+
+
+def layout_sockets(nodes, link_index, ui_scale=1.0):
+    return SocketCache(SocketLayout(nodes, link_index, ui_scale))
+
+
+class AxisClasses:
+
+    # Union-find over reroute coordinates along one axis (all x's or all y's). Reroutes in the same class
+    # end up sharing that coordinate. A class can also be pinned to an anchor, the coordinate of something
+    # that isn't going to move, like a node's socket or a reroute that isn't selected. Merging two classes
+    # is refused if it would drag any reroute nudge_limit or further from where it started, or pin the
+    # class to two anchors tolerance or further apart.
+
+    def __init__(self, nudge_limit, tolerance):
+        self.nudge_limit = nudge_limit
+        self.tolerance = tolerance
+        self.parent = {}
+        self.members = {}
+        self.anchor = {}
+        self.lo = {}
+        self.hi = {}
+
+    def add_reroute(self, key, value):
+        self.parent[key] = key
+        self.members[key] = 1
+        self.anchor[key] = None
+        self.lo[key] = value
+        self.hi[key] = value
+
+    def add_anchor(self, value):
+        key = ('anchor', len(self.parent))
+        self.parent[key] = key
+        self.members[key] = 0
+        self.anchor[key] = value
+        self.lo[key] = np.inf
+        self.hi[key] = -np.inf
+        return key
+
+    def find(self, key):
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, key_1, key_2):
+        root_1, root_2 = self.find(key_1), self.find(key_2)
+        if root_1 == root_2:
+            return True
+
+        anchor_1, anchor_2 = self.anchor[root_1], self.anchor[root_2]
+        if (anchor_1 is not None) and (anchor_2 is not None) and abs(anchor_1 - anchor_2) >= self.tolerance:
+            return False
+        anchor = anchor_1 if anchor_1 is not None else anchor_2
+        lo = min(self.lo[root_1], self.lo[root_2])
+        hi = max(self.hi[root_1], self.hi[root_2])
+        if anchor is not None:
+            if (hi - anchor >= self.nudge_limit) or (anchor - lo >= self.nudge_limit):
+                return False
+        elif (hi - lo) / 2 >= self.nudge_limit:
+            return False
+
+        # union by size
+        if self.members[root_1] < self.members[root_2]:
+            root_1, root_2 = root_2, root_1
+        self.parent[root_2] = root_1
+        self.members[root_1] += self.members[root_2]
+        self.anchor[root_1] = anchor
+        self.lo[root_1] = lo
+        self.hi[root_1] = hi
+        return True
+
+    # Where a reroute should end up along this axis, or None if nothing it's grouped with asks it to move
+    def value(self, key):
+        root = self.find(key)
+        if self.anchor[root] is not None:
+            return self.anchor[root]
+        if self.members[root] > 1:
+            return (self.lo[root] + self.hi[root]) / 2
+        return None
+
+
+# FIRST LOOP. Nudges selected reroute nodes into line with the things they're connected to.
+#
+# Every link from a selected reroute to something within nudge_limit on an axis is a candidate alignment.
+# Links to a node's socket can only line the reroute up horizontally with it, links to other reroutes can
+# use whichever axis is closer, falling back to the other one. Candidates are taken closest first and
+# merged into shared-x and shared-y classes (see AxisClasses), then every reroute is moved once to the
+# coordinate of its classes. A link that's already lined up within tolerance on an axis pins both its ends
+# where they are along it instead, the same way a noodle that's within tolerance is left alone everywhere
+# else. The result doesn't depend on the order the nodes were selected in.
+def nudge_reroutes(valid_nodes, socket_dict, link_index, nudge_limit, tolerance=5.0, stats=None, only_links=None):
+
+    stats = stats if stats is not None else RunStats()
+
+    movable = {n.name: n for n in valid_nodes if is_reroute(n)}
+    if len(movable) == 0:
+        return
+
+    classes = (AxisClasses(nudge_limit, tolerance), AxisClasses(nudge_limit, tolerance))
+    for name, node in movable.items():
+        classes[0].add_reroute(name, node.location.x)
+        classes[1].add_reroute(name, node.location.y)
+
+    candidates = []
+    for root_name, root_node in movable.items():
+        root_socket_dict = socket_dict[root_name]
+        for root_direction, target_direction in (('input', 'output'), ('output', 'input')):
+            for root_socket_info in root_socket_dict[root_direction].values():
+                for link, target_node, target_socket in link_index.get(root_node, root_socket_info.socket):
+
+                    # Links between two selected reroutes show up from both ends, only take them from one
+                    if (target_node.name in movable) and (root_direction == 'input'):
+                        continue
+                    if (only_links is not None) and (link_ref(link) not in only_links):
+                        continue
+                    stats.count('links_visited')
+
+                    try:
+                        target = socket_dict[target_node.name][target_direction][target_socket.identifier]
+                    except KeyError as e:
+                        stats.skip('nudge', e)
+                        continue
+
+                    x_distance = abs(target.x - root_socket_info.x)
+                    y_distance = abs(target.y - root_socket_info.y)
+
+                    if not is_reroute(target_node):
+                        axes = [(y_distance, 1)]
+                    elif x_distance <= y_distance:
+                        axes = [(x_distance, 0), (y_distance, 1)]
+                    else:
+                        axes = [(y_distance, 1), (x_distance, 0)]
+                    axes = [axis for distance, axis in axes if distance < nudge_limit]
+                    if len(axes) == 0:
+                        continue
+
+                    sort_key = (min(x_distance, y_distance) if is_reroute(target_node) else y_distance,
+                                root_name, target_node.name, target_socket.identifier)
+                    candidates.append((sort_key, root_name, target_node.name, (root_socket_info.x, root_socket_info.y),
+                                       (target.x, target.y), axes))
+
+    candidates.sort(key=lambda c: c[0])
+    for sort_key, root_name, target_name, root_position, target_position, axes in candidates:
+        for axis in axes:
+            if abs(target_position[axis] - root_position[axis]) < tolerance:
+                # Already lined up on this axis, so both ends are pinned where they are along it
+                if not classes[axis].union(root_name, classes[axis].add_anchor(root_position[axis])):
+                    continue
+                if target_name in movable:
+                    classes[axis].union(target_name, classes[axis].add_anchor(target_position[axis]))
+                break
+            if target_name in movable:
+                target_key = target_name
+            else:
+                target_key = classes[axis].add_anchor(target_position[axis])
+            if classes[axis].union(root_name, target_key):
+                break
+
+    for name, node in movable.items():
+        x, y = node.location
+        new_x = classes[0].value(name)
+        new_y = classes[1].value(name)
+        new_x = x if new_x is None else new_x
+        new_y = y if new_y is None else new_y
+        if (new_x, new_y) != (x, y):
+            node.location = (new_x, new_y)
+            socket_dict.invalidate(node)
+
+
+# Colours one cluster of channels like an interval graph: sweeping down their y-intervals in order, each
+# one takes the lowest-numbered lane that's free again by the time it starts, which needs as few lanes as
+# the worst pile-up in the cluster. Channels from the same output carry the same signal, so they share a
+# lane and just look like a single trunk. Returns the lane of each source and the number of lanes.
+def color_channels(channels, cluster, margin):
+
+    spans = {}
+    for i in cluster:
+        channel = channels[i]
+        y_min, y_max = spans.get(channel.source, (channel.y_min, channel.y_max))
+        spans[channel.source] = (min(y_min, channel.y_min), max(y_max, channel.y_max))
+
+    busy = []
+    free = []
+    lanes = {}
+    n_lanes = 0
+    for source, (y_min, y_max) in sorted(spans.items(), key=lambda s: (s[1], s[0])):
+        while len(busy) > 0 and busy[0][0] + margin <= y_min:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if len(free) > 0:
+            lane = heapq.heappop(free)
+        else:
+            lane = n_lanes
+            n_lanes += 1
+        heapq.heappush(busy, (y_max, lane))
+        lanes[source] = lane
+    return lanes, n_lanes
+
+
+# Works out an x for the vertical middle segment of every stairstep in the tree at once, so that segments
+# from different outputs don't end up drawn on top of each other. Channels that want to be within margin
+# of each other in x are grouped into clusters, each cluster is coloured into lanes, and the lanes are
+# spread margin apart around the middle of the cluster. A cluster that got wide enough to run into the
+# one before it is merged with it and coloured again. No channel is ever moved outside its own x_min and
+# x_max (past either end of its noodle): a cluster with more lanes than fit in the range its channels
+# share has them squeezed closer than margin, down to sharing one x if need be. Returns a list with the
+# new x of every channel, in the order they were given.
+def allocate_channels(channels, margin):
+
+    order = sorted(range(len(channels)), key=lambda i: channels[i].x)
+    clusters = []
+    for i in order:
+        if len(clusters) > 0 and channels[i].x - channels[clusters[-1][-1]].x < margin:
+            clusters[-1].append(i)
+        else:
+            clusters.append([i])
+
+    def color(cluster):
+        center = sum(channels[i].x for i in cluster) / len(cluster)
+        lanes, n_lanes = color_channels(channels, cluster, margin)
+        low, high = max(channels[i].x_min for i in cluster), min(channels[i].x_max for i in cluster)
+        spacing = margin
+        if low <= high and (n_lanes - 1) * margin > high - low:
+            # Not enough room, so squeeze them in evenly without putting any right at an end
+            spacing = (high - low) / (n_lanes + 1)
+            center = (low + high) / 2
+        half_width = (n_lanes - 1) / 2 * spacing
+        if low <= high:
+            center = min(max(center, low + half_width), high - half_width)
+        return cluster, center, lanes, half_width, spacing
+
+    placed = []
+    for cluster in clusters:
+        current = color(cluster)
+        while len(placed) > 0:
+            previous = placed[-1]
+            if (current[1] - current[3]) - (previous[1] + previous[3]) >= margin:
+                break
+            placed.pop()
+            current = color(previous[0] + current[0])
+        placed.append(current)
+
+    xs = [None] * len(channels)
+    for cluster, center, lanes, half_width, spacing in placed:
+        for i in cluster:
+            x = center + lanes[channels[i].source] * spacing - half_width
+            xs[i] = min(max(x, channels[i].x_min), channels[i].x_max)
+    return xs
+
+
+class RerouteIndex:
+
+    # A spatial hash of the reroutes in a tree, keyed by which tolerance-sized cell they're in and the output
+    # socket (as a socket_key) whose signal they carry, so that the second loop can find out in one lookup
+    # whether there's already a reroute with the right signal where it was about to make a new one. The
+    # signal a reroute carries can change as links are moved around, so anything found is checked again
+    # against the tree as it is before it's handed out. In a partial copy of a tree (see copy_tree), a
+    # signal is followed on through nodes.feeds where the copy runs out.
+
+    def __init__(self, nodes, link_index, tolerance):
+        self.nodes = nodes
+        self.feeds = getattr(nodes, 'feeds', {})
+        self.link_index = link_index
+        self.tolerance = max(tolerance, 1e-6)
+        self.cells = {}
+        sources = {}
+        for node in nodes:
+            if is_reroute(node) and len(node.inputs) > 0 and len(node.outputs) > 0:
+                self.add(node, self.upstream(node, sources)[0])
+
+    def cell(self, x, y):
+        return (math.floor(x / self.tolerance), math.floor(y / self.tolerance))
+
+    # Follows a node's input back through reroutes. Returns the socket_key of the output it ends up at (None
+    # if it runs out) and the names of every node on the way. Sources found along the way are remembered
+    # in known, if it's given.
+    def upstream(self, node, known=None):
+        known = known if known is not None else {}
+        chain = []
+        source = None
+        name, reroute = node.name, is_reroute(node)
+        while True:
+            if name in known:
+                source = known[name]
+                break
+            if not reroute or name in chain:
+                break
+            chain.append(name)
+            feed = self.feed(name)
+            if feed is None:
+                break
+            name, identifier, reroute = feed
+            if not reroute:
+                source = (name, identifier, 'output')
+                chain.append(name)
+                break
+        for name in chain:
+            known[name] = source
+        return source, set(chain)
+
+    # What the reroute called name is fed from, as (node name, socket identifier, whether that node is a
+    # reroute), or None if nothing is linked into it
+    def feed(self, name):
+        node = self.nodes.get(name)
+        if node is not None and len(node.inputs) > 0:
+            entries = self.link_index.get(node, node.inputs[0])
+            if len(entries) > 0:
+                _, node, socket = entries[0]
+                return node.name, socket.identifier, is_reroute(node)
+        return self.feeds.get(name)
+
+    def add(self, node, source):
+        if source is not None:
+            x, y = node.location
+            self.cells.setdefault((*self.cell(x, y), source), []).append(node)
+
+    # The reroute nearest (x, y), within tolerance of it on both axes, that carries source and could be
+    # linked into to_socket on to_node without making a loop or a second link. None if there isn't one.
+    def find(self, x, y, source, to_node, to_socket):
+        i, j = self.cell(x, y)
+        candidates = []
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for node in self.cells.get((i + di, j + dj, source), ()):
+                    dx, dy = abs(node.location.x - x), abs(node.location.y - y)
+                    if dx < self.tolerance and dy < self.tolerance:
+                        candidates.append((dx + dy, node.name, node))
+        for _, _, node in sorted(candidates, key=lambda c: c[:2]):
+            if node is to_node:
+                continue
+            found, chain = self.upstream(node)
+            if found != source or to_node.name in chain:
+                continue
+            if any(entry.node is to_node and entry.socket is to_socket
+                   for entry in self.link_index.get(node, node.outputs[0])):
+                continue
+            return node
+        return None
+
+
+# A link on its way to becoming a stairstep: the socket info it was found from, the socket and socket info
+# at the other end, the x its vertical middle segment wants to be at, how far either way it can go, and the
+# output it carries.
+Stairstep = namedtuple('Stairstep', ['root', 'target_socket', 'target', 'x', 'x_min', 'x_max', 'source'])
+
+
+def step_from(step):
+    return step.root if step.root.direction == 'output' else step.target
+
+
+def step_to(step):
+    return step.target if step.root.direction == 'output' else step.root
+
+
+# Replaces a link with two reroutes and three right-angle links: across from the root, down (or up) to the
+# height of the target, and across again. Returns the Channel of its middle segment.
+def add_stairstep(nodes, socket_dict, link_index, step):
+    root_socket, target_socket = step.root.socket, step.target_socket
+
+    reroute_1 = nodes.new('NodeReroute')
+    reroute_1.location = (step.x, step.root.y)
+    socket_dict.add(reroute_1)
+
+    reroute_2 = nodes.new('NodeReroute')
+    reroute_2.location = (step.x, step.target.y)
+    socket_dict.add(reroute_2)
+
+    if step.root.direction == 'input':
+        link_index.new(reroute_1.outputs[0], root_socket)
+        link_index.new(target_socket, reroute_2.inputs[0])
+        link_index.new(reroute_2.outputs[0], reroute_1.inputs[0])
+    if step.root.direction == 'output':
+        link_index.new(root_socket, reroute_1.inputs[0])
+        link_index.new(reroute_2.outputs[0], target_socket)
+        link_index.new(reroute_1.outputs[0], reroute_2.inputs[0])
+
+    return Channel(step.x, step.x_min, step.x_max, min(step.root.y, step.target.y),
+                   max(step.root.y, step.target.y), step.source, (reroute_1, reroute_2))
+
+
+# Replaces all the stairsteps from one output with a single vertical trunk: one reroute level with the
+# output, then one branch reroute for every distinct height the inputs are at (inputs within tolerance of
+# each other in y share one), chained up and down the trunk from the first. The trunk goes at the
+# leftmost of the stairsteps' own middle x's, so it's clear of every input it feeds, and can only be moved
+# as far as every one of them could have been. An output driving n inputs at different heights gets n + 1
+# reroutes and 2n + 1 links instead of 2n and 3n. Returns the Channel of the whole trunk.
+def add_trunk(nodes, socket_dict, link_index, stairsteps, tolerance):
+    output, x = step_from(stairsteps[0]), min(step.x for step in stairsteps)
+
+    branches = []
+    for step in sorted(stairsteps, key=lambda step: step_to(step).y):
+        if len(branches) > 0 and step_to(step).y - branches[-1][0] < tolerance:
+            branches[-1][1].append(step)
+        else:
+            branches.append((step_to(step).y, [step]))
+
+    trunk = nodes.new('NodeReroute')
+    trunk.location = (x, output.y)
+    socket_dict.add(trunk)
+    link_index.new(output.socket, trunk.inputs[0])
+    reroutes = [trunk]
+
+    above = [branch for branch in branches if branch[0] > output.y]
+    below = [branch for branch in reversed(branches) if branch[0] <= output.y]
+    for side in (above, below):
+        previous = trunk
+        for y, steps in side:
+            reroute = nodes.new('NodeReroute')
+            reroute.location = (x, y)
+            socket_dict.add(reroute)
+            link_index.new(previous.outputs[0], reroute.inputs[0])
+            for step in steps:
+                link_index.new(reroute.outputs[0], step_to(step).socket)
+            reroutes.append(reroute)
+            previous = reroute
+
+    x_min, x_max = max(step.x_min for step in stairsteps), min(step.x_max for step in stairsteps)
+    if not x_min <= x <= x_max:
+        x_min = x_max = x
+
+    ys = [output.y] + [y for y, steps in branches]
+    return Channel(x, x_min, x_max, min(ys), max(ys), stairsteps[0].source, tuple(reroutes))
+
+
+# SECOND LOOP. Replaces every link that's still off-axis with reroutes and right-angle links, one root
+# node at a time: yields how many root nodes are done after each one.
+#
+# With fan_out, an output with several links that need a stairstep gets a single trunk for all of them
+# instead (see add_trunk), so long as they all head right from it.
+def iter_reroute_links(valid_nodes, nodes, socket_dict, link_index, tolerance, noodle_margin=20.0, obstacles=None,
+                       stats=None, only_links=None, fan_out=False):
+
+    stats = stats if stats is not None else RunStats()
+
+    # Pick up the new positions of any reroutes that got nudged. Nothing moves during the second
+    # loop, so after this the only nodes that need their sockets computed are the new reroutes,
+    # which get added to the cache as they're created.
+    socket_dict.refresh(nodes)
+
+    # Nothing that's already in the tree moves from here on, so whether each existing link is aligned can
+    # be worked out for all of them at once. Links made during this loop get checked one at a time.
+    aligned_links = socket_dict.layout.aligned_links(link_index.links, tolerance)
+
+    # The vertical middle segments of the stairsteps made along the way, which get spread out into
+    # their own lanes once they're all known
+    channels = []
+
+    # How far apart the middle x's tried when dodging nodes are
+    detour_step = max(noodle_margin, tolerance)
+    detour_reach = NodeGrid.MAX_DETOURS * detour_step
+
+    # With fan_out, the stairsteps waiting to be turned into a trunk, by the output they come from
+    fans = {}
+
+    # Reroutes that are already carrying a signal somewhere, so they can be linked into rather than
+    # putting a new one down right next to them
+    reroutes = RerouteIndex(nodes, link_index, tolerance)
+
+    for done, root_node in enumerate(valid_nodes, 1):
+
+        root_socket_dict = socket_dict[root_node.name]
+
+        # for each linked socket, we'll loop through its links
+        for root_direction in ['input', 'output']:
+            linked_sockets = [s[1] for s in root_socket_dict[root_direction].items()
+                              if link_index.is_linked(root_node, s[1].socket)]
+            for root_socket_info in linked_sockets:
+                links = link_index.get(root_node, root_socket_info.socket)
+                for link, target_node, target_socket in links:
+                    if (only_links is not None) and (link_ref(link) not in only_links):
+                        continue
+                    stats.count('links_visited')
+
+                    # Determining the target node and socket our root node and socket are connected to.
+                    if root_direction == 'input':
+                        target_direction = 'output'
+
+                    if root_direction == 'output':
+                        target_direction = 'input'
+                    try:
+                        target_socket_info = socket_dict[target_node.name][target_direction][target_socket.identifier]
+                    except KeyError as e:
+                        stats.skip('rewire', e)
+                        continue
+
+                    # First, we check if these coordinates are already aligned (within a margin of error)
+                    aligned = aligned_links.get(link)
+                    if aligned is None:
+                        aligned = check_aligned(root_socket_info, target_socket_info, tolerance)
+                    if aligned:
+                        # If they are, we can skip this link
+                        continue
+                    else:
+
+                        root_x, root_y = root_socket_info.x, root_socket_info.y
+                        target_x, target_y = target_socket_info.x, target_socket_info.y
+
+                        link_index.remove(link)
+
+                        root_socket = root_socket_info.socket
+
+                        # Which end the link comes from, and the output its signal started at before
+                        # going through any reroutes
+                        if root_socket_info.direction == 'input':
+                            from_node, from_socket = target_node, target_socket
+                            to_node, to_socket, to_y = root_node, root_socket, root_y
+                        if root_socket_info.direction == 'output':
+                            from_node, from_socket = root_node, root_socket
+                            to_node, to_socket, to_y = target_node, target_socket, target_y
+                        source = socket_key(from_node, from_socket)
+                        signal = reroutes.upstream(from_node)[0] if is_reroute(from_node) else source
+
+                        both_nodes = (not is_reroute(root_node)) and (not is_reroute(target_node))
+                        both_reroutes = is_reroute(root_node) and is_reroute(target_node)
+                        hetero = (not both_nodes) and (not both_reroutes)
+
+                        # Halfway between for now, allocate_channels moves it sideways afterwards (but
+                        # no further than x_min and x_max) if it would overlap another noodle
+                        middle_x_coord = (root_x + target_x) / 2
+                        x_min, x_max = min(root_x, target_x), max(root_x, target_x)
+
+                        # Steer clear of running the new noodle underneath other nodes where we can
+                        if obstacles is not None:
+                            ignore = (root_node.name, target_node.name)
+                            root_point, target_point = Point(root_x, root_y), Point(target_x, target_y)
+                            if both_nodes:
+                                middle_x_coord, _ = obstacles.best_middle_x(root_point, target_point, detour_step, ignore)
+                            if hetero:
+                                corner = Point(root_x, target_y) if is_reroute(root_node) else Point(target_x, root_y)
+                                blocked = obstacles.path_blocked([root_point, corner, target_point], ignore)
+                                if blocked > 0:
+                                    # A stairstep has more room to get around things than a single corner
+                                    clear_x, stairstep_blocked = obstacles.best_middle_x(root_point, target_point,
+                                                                                         detour_step, ignore)
+                                    if stairstep_blocked < blocked:
+                                        middle_x_coord = clear_x
+                                        both_nodes, hetero = True, False
+                            if both_nodes:
+                                # so that moving it into a lane can't put it back under a node
+                                x_min, x_max = obstacles.clear_range(root_point, target_point, middle_x_coord,
+                                                                     detour_reach, ignore)
+
+                        # If the nodes are both non-reroutes, create a "stairstep" pattern
+                        # between them by deleting the existing link and adding two new reroute nodes and 3 new links
+                        if both_nodes:
+
+                            stairstep = Stairstep(root_socket_info, target_socket, target_socket_info,
+                                                  middle_x_coord, x_min, x_max, source)
+                            existing = reroutes.find(middle_x_coord, to_y, signal, to_node, to_socket)
+                            if existing is not None:
+                                # The last corner of the stairstep is already there with the right signal
+                                link_index.new(existing.outputs[0], to_socket)
+                                stats.count('reroutes_reused')
+                            elif fan_out:
+                                # Put off until every link from the same output is known
+                                fans.setdefault(source, []).append(stairstep)
+                            else:
+                                # Not added to the reroute index: allocate_channels is still going to move
+                                # these sideways, which would leave anything linked into them off-axis
+                                channels.append(add_stairstep(nodes, socket_dict, link_index, stairstep))
+
+                        # If one node is a reroute and the other isn't, though, we can add in just one reroute node
+                        # and have it horizontally aligned with the normal node while vertically aligned with the
+                        # reroute node.
+                        if hetero:
+                            corner = (root_x, target_y) if is_reroute(root_node) else (target_x, root_y)
+                            existing = reroutes.find(*corner, signal, to_node, to_socket)
+                            if existing is not None:
+                                link_index.new(existing.outputs[0], to_socket)
+                                stats.count('reroutes_reused')
+                                continue
+                            reroute = nodes.new('NodeReroute')
+                            reroute.location = corner
+                            socket_dict.add(reroute)
+                            reroutes.add(reroute, signal)
+
+                            if root_socket_info.direction == 'input':
+                                link_index.new(reroute.outputs[0], root_socket)
+                                link_index.new(target_socket, reroute.inputs[0])
+                            if root_socket_info.direction == 'output':
+                                link_index.new(root_socket, reroute.inputs[0])
+                                link_index.new(reroute.outputs[0], target_socket)
+
+                        # If both nodes are reroutes, we just travel sideways from the root node,
+                        # place a reroute, then up/down to the target node
+                        # (or up/down first, if going sideways first would pass under a node and the other
+                        # way round wouldn't)
+                        if both_reroutes:
+
+                            corner = (target_x, root_y)
+                            if obstacles is not None:
+                                if obstacles.path_blocked([root_point, (root_x, target_y), target_point], ignore) < \
+                                        obstacles.path_blocked([root_point, corner, target_point], ignore):
+                                    corner = (root_x, target_y)
+
+                            existing = reroutes.find(*corner, signal, to_node, to_socket)
+                            if existing is not None:
+                                link_index.new(existing.outputs[0], to_socket)
+                                stats.count('reroutes_reused')
+                                continue
+                            reroute = nodes.new('NodeReroute')
+                            reroute.location = corner
+                            socket_dict.add(reroute)
+                            reroutes.add(reroute, signal)
+
+                            if root_socket_info.direction == 'input':
+                                link_index.new(reroute.outputs[0], root_socket)
+                                link_index.new(target_socket, reroute.inputs[0])
+                            if root_socket_info.direction == 'output':
+                                link_index.new(root_socket, reroute.inputs[0])
+                                link_index.new(reroute.outputs[0], target_socket)
+
+        yield done
+
+    for stairsteps in fans.values():
+        forward = [step for step in stairsteps if step_from(step).x < step_to(step).x]
+        if len(forward) < 2:
+            forward = []
+        for step in stairsteps:
+            if step not in forward:
+                channels.append(add_stairstep(nodes, socket_dict, link_index, step))
+        if len(forward) > 0:
+            channels.append(add_trunk(nodes, socket_dict, link_index, forward, tolerance))
+
+    # Only the x of the stairstep reroutes changes, so every link they're part of stays as aligned as
+    # it was when it was made
+    for channel, x in zip(channels, allocate_channels(channels, noodle_margin)):
+        for reroute in channel.reroutes:
+            reroute.location = (x, reroute.location.y)
+            socket_dict.add(reroute)
+
+
+def collinear_axis(points, tolerance):
+    xs = [p.x for p in points]
+    ys = [p.y for p in points]
+    if max(ys) - min(ys) < tolerance:
+        return 1
+    if max(xs) - min(xs) < tolerance:
+        return 0
+    return None
+
+
+def remove_reroute(nodes, link_index, node):
+    for socket in [*node.inputs, *node.outputs]:
+        for link, _, _ in link_index.get(node, socket):
+            link_index.remove(link)
+    nodes.remove(node)
+
+
+# Cleans up the reroutes that pile up when the operator is run over and over as a tree changes. Only the
+# reroutes named in removable (all of them if it's None) are touched. Two things happen:
+#
+# 1. Reroutes fed straight from the same socket that sit on top of each other get merged into one, and
+#    ones lined up along the same straight trunk from that socket get chained one after the other
+#    instead of each running their own overlapping noodle back to the socket.
+# 2. A reroute whose incoming and outgoing noodles all lie on one straight line is doing nothing, so it's
+#    removed and the noodles are spliced back together. This repeats along chains of them.
+#
+# Returns the number of reroutes removed.
+def compact_reroutes(nodes, links, tolerance=5.0, ui_scale=1.0, removable=None):
+
+    link_index = LinkIndex(links)
+    socket_dict = SocketCache(SocketLayout(nodes, link_index, ui_scale))
+    reroutes = {n.name: n for n in nodes if n.bl_idname == 'NodeReroute'
+                and (removable is None or n.name in removable)}
+    removed = 0
+
+    def position(node, direction, socket):
+        return socket_dict[node.name][direction][socket.identifier]
+
+    # Whether every outgoing noodle of node that's aligned now would still be aligned coming out of kept
+    def merge_keeps_alignment(node, kept, entries):
+        try:
+            start = position(node, 'output', node.outputs[0])
+            new_start = position(kept, 'output', kept.outputs[0])
+        except KeyError:
+            return False
+        for _, target_node, target_socket in entries:
+            try:
+                end = position(target_node, 'input', target_socket)
+            except KeyError:
+                return False
+            if check_aligned(start, end, tolerance) and not check_aligned(new_start, end, tolerance):
+                return False
+        return True
+
+    # 1. Merge and chain reroutes hanging off the same socket
+    fed_by = {}
+    for name, node in reroutes.items():
+        entries = link_index.get(node, node.inputs[0])
+        if len(entries) == 1:
+            link, source_node, source_socket = entries[0]
+            if source_node.name == name:
+                continue
+            fed_by.setdefault(socket_key(source_node, source_socket), []).append(node)
+
+    for key, fed in fed_by.items():
+        if len(fed) < 2:
+            continue
+        _, source_node, source_socket = link_index.get(fed[0], fed[0].inputs[0])[0]
+        try:
+            source = position(source_node, 'output', source_socket)
+        except KeyError:
+            continue
+        source = Point(source.x, source.y)
+
+        fed.sort(key=lambda n: ((n.location.x - source.x)**2 + (n.location.y - source.y)**2, n.name))
+        trunk = []
+        for node in fed:
+            here = Point(*node.location)
+            merged = False
+            for kept in trunk:
+                if (abs(kept.location.x - here.x) < tolerance) and (abs(kept.location.y - here.y) < tolerance):
+                    # Sitting on top of a reroute we're keeping: hand over the outgoing noodles and go away,
+                    # unless the little offset between the two would knock one of them off its axis
+                    entries = link_index.get(node, node.outputs[0])
+                    if not merge_keeps_alignment(node, kept, entries):
+                        continue
+                    targets = [target_socket for _, _, target_socket in entries]
+                    remove_reroute(nodes, link_index, node)
+                    for target_socket in targets:
+                        link_index.new(kept.outputs[0], target_socket)
+                    reroutes.pop(node.name, None)
+                    removed += 1
+                    merged = True
+                    break
+            if merged:
+                continue
+
+            # Otherwise, if it's further along the same straight trunk as reroutes we've kept, feed it from
+            # the furthest one of those rather than all the way back from the socket
+            feeder = None
+            for kept in trunk:
+                axis = collinear_axis([source, Point(*kept.location), here], tolerance)
+                if axis is None:
+                    continue
+                other = 1 - axis
+                kept_offset = kept.location[other] - source[other]
+                here_offset = here[other] - source[other]
+                if (kept_offset * here_offset > 0) and (abs(kept_offset) < abs(here_offset)):
+                    feeder = kept
+            if feeder is not None:
+                link_index.new(feeder.outputs[0], node.inputs[0])
+            trunk.append(node)
+
+    # 2. Splice out reroutes in the middle of a straight line
+    queue = sorted(reroutes)
+    queued = set(queue)
+    while len(queue) > 0:
+        name = queue.pop()
+        queued.discard(name)
+        node = reroutes.get(name)
+        if node is None:
+            continue
+
+        entries_in = link_index.get(node, node.inputs[0])
+        entries_out = link_index.get(node, node.outputs[0])
+        if (len(entries_in) != 1) or (len(entries_out) == 0):
+            continue
+        _, source_node, source_socket = entries_in[0]
+        # A reroute that loops back on itself can't be spliced out
+        if any(n.name == name for n in [source_node] + [target_node for _, target_node, _ in entries_out]):
+            continue
+        try:
+            points = [position(source_node, 'output', source_socket), Point(*node.location)]
+            points += [position(target_node, 'input', target_socket) for _, target_node, target_socket in entries_out]
+        except KeyError:
+            continue
+        if collinear_axis(points, tolerance) is None:
+            continue
+
+        remove_reroute(nodes, link_index, node)
+        del reroutes[name]
+        removed += 1
+        for _, target_node, target_socket in entries_out:
+            link_index.new(source_socket, target_socket)
+
+        # The neighbours might now be in the middle of a straight line themselves
+        for neighbour in [source_node] + [target_node for _, target_node, _ in entries_out]:
+            if (neighbour.name in reroutes) and (neighbour.name not in queued):
+                queue.append(neighbour.name)
+                queued.add(neighbour.name)
+
+    return removed
+
+
+class RunStats:
+
+    # Tallies what a run got up to: how many nodes and links the loops looked at, and every socket that
+    # had to be skipped because its position couldn't be worked out (a KeyError), along with the phase
+    # and the missing key so it can be tracked down afterwards.
+
+    def __init__(self):
+        self.counts = {'nodes_visited': 0, 'links_visited': 0, 'key_errors': 0, 'reroutes_reused': 0}
+        self.skipped = []
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def skip(self, phase, error):
+        self.counts['key_errors'] += 1
+        self.skipped.append((phase, str(error)))
+
+
+class PhaseTimer:
+
+    # Writes the wall time of each phase into a timings dict in seconds, if one was given
+
+    def __init__(self, timings=None):
+        self.timings = timings
+        self.clock = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings[phase] = self.timings.get(phase, 0.0) + (now - self.clock)
+        self.clock = now
+
+    # Time spent between pause() and resume() isn't counted towards any phase
+    def pause(self):
+        self.paused = time.perf_counter()
+
+    def resume(self):
+        self.clock += time.perf_counter() - self.paused
+
+
+# Hands a Progress out of one of the iter_ functions below, with the clock stopped while the caller has it
+def report_progress(timer, phase, done=1, total=1):
+    timer.pause()
+    yield Progress(phase, done, total)
+    timer.resume()
+
+
+# Runs one of the iter_ functions below to the end and returns what it returned
+def run_steps(steps):
+    while True:
+        try:
+            next(steps)
+        except StopIteration as finished:
+            return finished.value
+
+
+# Runs both loops directly on a tree's nodes and links, editing it as it goes, in small steps: yields a
+# Progress after each phase and after each root node of the second loop, so that whoever's driving it can
+# stop in between and pick up again later. Returns False if there was nothing to do. The operator never
+# runs this on the real tree, it runs it on a snapshot (see plan_square_noodles).
+def iter_square_in_place(nodes, links, tolerance=5.0, nudge_limit=100.0, noodle_margin=20.0, ui_scale=1.0,
+                         timer=None, stats=None, only_links=None, fan_out=False):
+
+    timer = timer if timer is not None else PhaseTimer()
+    stats = stats if stats is not None else RunStats()
+
+    link_index = LinkIndex(links)
+    valid_nodes = find_valid_nodes(nodes, link_index)
+    stats.count('nodes_visited', len(valid_nodes))
+    timer.lap('index')
+
+    if len(valid_nodes) == 0:
+        return False
+    yield from report_progress(timer, 'index')
+
+    socket_dict = layout_sockets(nodes, link_index, ui_scale)
+    obstacles = NodeGrid(nodes, ui_scale)
+    timer.lap('layout')
+    yield from report_progress(timer, 'layout')
+
+    # IT DOES NEED TO BE TWO LOOPS.
+    nudge_reroutes(valid_nodes, socket_dict, link_index, nudge_limit, tolerance, stats, only_links)
+    timer.lap('nudge')
+    yield from report_progress(timer, 'nudge')
+
+    for done in iter_reroute_links(valid_nodes, nodes, socket_dict, link_index, tolerance, noodle_margin,
+                                   obstacles, stats, only_links, fan_out):
+        yield from report_progress(timer, 'rewire', done, len(valid_nodes))
+    timer.lap('rewire')
+
+    return True
+
+
+def link_ref(link):
+    return LinkRef(link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+
+
+class LinkTracker:
+
+    # Remembers where both ends of every link in a tree were (as get_socket_dict works them out) the last
+    # time update() was called, so that an automatic re-square only has to deal with links that are new or
+    # have an end that moved since. A node's sockets are only worked out again when something about it
+    # that could move them changed, or a link into it came or went (which can make an input tall), so
+    # looking at a tree where nothing happened is just one pass over its nodes and links.
+
+    def __init__(self, ui_scale=1.0):
+        self.ui_scale = ui_scale
+        self.node_states = {}
+        self.socket_dicts = {}
+        self.fingerprints = {}
+        self.primed = False
+
+    @staticmethod
+    def node_state(node):
+        sockets = tuple((s.hide, s.enabled, s.hide_value) for s in [*node.inputs, *node.outputs])
+        return (tuple(node.location), tuple(node.dimensions), node.hide, sockets)
+
+    def fingerprint(self, ref):
+        try:
+            start = self.socket_dicts[ref.from_node]['output'][ref.from_socket]
+            end = self.socket_dicts[ref.to_node]['input'][ref.to_socket]
+        except KeyError:
+            return None
+        return (start.x, start.y, end.x, end.y)
+
+    # Takes in the tree as it is now, and returns the LinkRef of every link that's new or has moved since
+    # the last call. The first call only takes note of where everything is and returns nothing.
+    def update(self, nodes, links):
+        links = list(links)
+        refs = [link_ref(l) for l in links]
+
+        states = {node.name: self.node_state(node) for node in nodes}
+        changed = {name for name, state in states.items() if self.node_states.get(name) != state}
+        changed.update(ref.to_node for ref in set(refs).symmetric_difference(self.fingerprints))
+
+        if len(changed) > 0:
+            # Only the links of the nodes being worked out again can make any difference to them
+            link_index = LinkIndex([link for link, ref in zip(links, refs)
+                                    if ref.from_node in changed or ref.to_node in changed])
+            for node in nodes:
+                if node.name in changed:
+                    self.socket_dicts[node.name] = get_socket_dict(node, link_index, self.ui_scale)
+        for name in set(self.socket_dicts) - set(states):
+            del self.socket_dicts[name]
+        self.node_states = states
+
+        moved = []
+        fingerprints = {}
+        for ref in refs:
+            if (ref in self.fingerprints) and (ref.from_node not in changed) and (ref.to_node not in changed):
+                fingerprints[ref] = self.fingerprints[ref]
+                continue
+            fingerprints[ref] = self.fingerprint(ref)
+            if fingerprints[ref] != self.fingerprints.get(ref, ()):
+                moved.append(ref)
+        self.fingerprints = fingerprints
+        first, self.primed = not self.primed, True
+        return [] if first else moved
+
+
+def find_socket(sockets, identifier):
+    for socket in sockets:
+        if socket.identifier == identifier:
+            return socket
+    raise KeyError(identifier)
+
+
+class EditPlan:
+
+    # Everything square noodles wants to change about a tree, as plain names and numbers so that it can
+    # be inspected, pickled or thrown away without ever having touched the tree: existing reroutes to
+    # move, reroutes to create (named however the snapshot named them, only used to refer to them in
+    # added_links), reroutes to remove, and links to remove and add. It also carries how long each phase
+    # of working it out took, in seconds, and the RunStats of the run.
+
+    def __init__(self):
+        self.moves = []
+        self.new_reroutes = []
+        self.removed_nodes = []
+        self.removed_links = []
+        self.added_links = []
+        self.timings = {}
+        self.stats = RunStats()
+
+    def counts(self):
+        return {
+            'reroutes_moved': len(self.moves),
+            'reroutes_created': len(self.new_reroutes),
+            'reroutes_removed': len(self.removed_nodes),
+            'links_removed': len(self.removed_links),
+            'links_added': len(self.added_links),
+        }
+
+    # The plan as plain lists and dicts, ready for json. Moves and new reroutes are [name, x, y] and links
+    # are [from_node, from_socket, to_node, to_socket], the same way graph files write them.
+    def to_dict(self):
+        return {
+            'moves': [list(move) for move in self.moves],
+            'new_reroutes': [list(reroute) for reroute in self.new_reroutes],
+            'removed_nodes': list(self.removed_nodes),
+            'removed_links': [list(ref) for ref in self.removed_links],
+            'added_links': [list(ref) for ref in self.added_links],
+        }
+
+    def __repr__(self):
+        counts = ', '.join(f'{k}={v}' for k, v in self.counts().items())
+        return f'<EditPlan {counts}>'
+
+
+class SelectionScope:
+
+    # The part of a tree that squaring the selected nodes (by name, all the selected ones if it's None) can
+    # touch: the selection and every node linked straight to one of them, which is everything the two
+    # loops will look at the sockets of (names), and every link with an end at one of those, in tree order
+    # (links). It's found in one pass over the tree's nodes and one over its links, which is all of the
+    # tree that squaring a selection reads, since those passes are what's slow in Blender. Each node and
+    # link comes with the names read off it, as (node, name, bl_idname) and (link, from name, to name).
+    # The links left out of the scope are in outside.
+
+    def __init__(self, nodes, links, selected=None):
+        self.nodes = [(node, node.name, node.bl_idname) for node in nodes]
+        if selected is None:
+            selected = {name for node, name, _ in self.nodes if node.select}
+        self.selected = set(selected)
+        self.names = set(self.selected)
+
+        ends = []
+        touching = {}
+        for link in links:
+            from_name, to_name = link.from_node.name, link.to_node.name
+            touching.setdefault(from_name, []).append(len(ends))
+            touching.setdefault(to_name, []).append(len(ends))
+            ends.append((link, from_name, to_name))
+            if from_name in self.selected or to_name in self.selected:
+                self.names.add(from_name)
+                self.names.add(to_name)
+
+        kept = set()
+        for name in self.names:
+            kept.update(touching.get(name, ()))
+        self.links = [ends[i] for i in sorted(kept)]
+        self.outside = [end for i, end in enumerate(ends) if i not in kept]
+
+    # Whether the scope is the whole tree
+    @property
+    def complete(self):
+        return len(self.names) == len(self.nodes)
+
+
+# Snapshots just the part of a tree that squaring the selected nodes (by name) can touch, so that the
+# cost of everything after it goes with the size of the selection rather than the tree. That's the
+# selection and its neighbours (see SelectionScope), the nodes on the other end of the neighbours'
+# links as stand-ins, and outlines of whatever else is in the area their rectangles and sockets cover
+# (give or take tolerance), since a new noodle or corner can't leave that area. Those are all it could
+# run underneath, or any reroute it could link into instead of making a new one. The rest of the tree
+# only gets its positions and sizes read. If everything is in scope, it's the same as a plain copy_tree.
+# The tree is read through scope, which is worked out here if it isn't given.
+#
+# Squaring the snapshot plans exactly what squaring a full copy of the tree would: the links it leaves
+# out are never touched, and where a reroute gets its signal from beyond them is in snapshot.nodes.feeds.
+def snapshot_selection(nodes, links, selected, ui_scale=1.0, tolerance=5.0, scope=None):
+    if scope is None:
+        scope = SelectionScope(nodes, links, selected)
+    tree = copy_tree(nodes, links, scope=scope)
+    if scope.complete:
+        return tree
+
+    link_index = LinkIndex(tree.links)
+    xs, ys = [], []
+    for name in scope.names:
+        node = tree.nodes[name]
+        x_min, y_min, x_max, y_max = node_rect(node, ui_scale)
+        xs += [x_min, x_max]
+        ys += [y_min, y_max]
+        for sockets in get_socket_dict(node, link_index, ui_scale).values():
+            xs += [socket.x for socket in sockets.values()]
+            ys += [socket.y for socket in sockets.values()]
+    if len(xs) == 0:
+        return tree
+    area = (min(xs) - tolerance, min(ys) - tolerance, max(xs) + tolerance, max(ys) + tolerance)
+
+    outlines = []
+    for node, name, bl_idname in scope.nodes:
+        if name not in tree.nodes.reserved or bl_idname == 'NodeFrame':
+            continue
+        if bl_idname == 'NodeReroute':
+            x, y = node.location
+            if area[0] <= x <= area[2] and area[1] <= y <= area[3]:
+                outlines.append(node)
+            continue
+        x_min, y_min, x_max, y_max = node_rect(node, ui_scale)
+        if x_min <= area[2] and x_max >= area[0] and y_min <= area[3] and y_max >= area[1]:
+            outlines.append(node)
+    add_outlines(tree, outlines)
+    return tree
+
+
+# Works out what square noodles would do to a tree without touching it. The part of the tree around the
+# selection is read once into a MockTree snapshot (see snapshot_selection), both loops run on the
+# snapshot, and the difference between the snapshot before and after becomes the plan. With compact on,
+# selected reroutes and the ones that were just made are then cleaned up with compact_reroutes. Returns
+# None if there was nothing to do. Phase timings are added to timings if it's given, and end up in the
+# plan's timings either way.
+#
+# Given only_links (LinkRefs, e.g. from a LinkTracker), only those links are squared, and the nodes at
+# either end of them take the place of the selection. A SelectionScope the caller already has for the
+# selection can be passed in as scope so the tree isn't read again.
+def plan_square_noodles(nodes, links, tolerance=5.0, nudge_limit=100.0, noodle_margin=20.0, ui_scale=1.0,
+                        compact=False, timings=None, only_links=None, fan_out=False, scope=None):
+    return run_steps(iter_plan_square_noodles(nodes, links, tolerance, nudge_limit, noodle_margin, ui_scale,
+                                              compact, timings, only_links, fan_out, scope))
+
+
+# plan_square_noodles in small steps, yielding a Progress every so often (see iter_square_in_place). The
+# plan comes back as the generator's return value. Stopping part way through leaves the tree untouched,
+# since everything up to the plan happens on the snapshot.
+def iter_plan_square_noodles(nodes, links, tolerance=5.0, nudge_limit=100.0, noodle_margin=20.0, ui_scale=1.0,
+                             compact=False, timings=None, only_links=None, fan_out=False, scope=None):
+
+    timings = timings if timings is not None else {}
+    timer = PhaseTimer(timings)
+    stats = RunStats()
+    if only_links is not None:
+        only_links = set(only_links)
+        selected = {ref.from_node for ref in only_links} | {ref.to_node for ref in only_links}
+        if scope is None:
+            scope = SelectionScope(nodes, links, selected)
+    elif scope is None:
+        scope = SelectionScope(nodes, links)
+    selected = scope.selected
+    snapshot = snapshot_selection(nodes, links, selected, ui_scale, tolerance, scope)
+    if only_links is not None:
+        for node in snapshot.nodes:
+            node.select = node.name in selected
+    start_locations = {n.name: tuple(n.location) for n in snapshot.nodes}
+    start_links = list(snapshot.links)
+    timer.lap('snapshot')
+    yield from report_progress(timer, 'snapshot')
+
+    squared = yield from iter_square_in_place(snapshot.nodes, snapshot.links, tolerance, nudge_limit, noodle_margin,
+                                              ui_scale, timer, stats, only_links, fan_out)
+    if not squared:
+        return None
+
+    if compact:
+        removable = {n.name for n in snapshot.nodes if n.select or n.name not in start_locations}
+        compact_reroutes(snapshot.nodes, snapshot.links, tolerance, ui_scale, removable)
+        timer.lap('compact')
+        yield from report_progress(timer, 'compact')
+
+    plan = EditPlan()
+    plan.timings = timings
+    plan.stats = stats
+    end_names = {n.name for n in snapshot.nodes}
+    plan.removed_nodes = [name for name in start_locations if name not in end_names]
+    for node in snapshot.nodes:
+        start = start_locations.get(node.name)
+        if start is None:
+            plan.new_reroutes.append(NodeMove(node.name, node.location.x, node.location.y))
+        elif tuple(node.location) != start:
+            plan.moves.append(NodeMove(node.name, node.location.x, node.location.y))
+    end_links = set(snapshot.links)
+    plan.removed_links = [link_ref(l) for l in start_links if l not in end_links]
+    start_links = set(start_links)
+    plan.added_links = [link_ref(l) for l in snapshot.links if l not in start_links]
+    timer.lap('plan')
+
+    return plan
+
+
+# Makes the changes in an EditPlan to a real tree (or a MockTree) in one go
+def apply_plan(plan, nodes, links, timings=None, scope=None):
+
+    timer = PhaseTimer(timings)
+
+    # Only the nodes the plan names are looked up. New reroutes are kept under the name the plan gave
+    # them, since Blender may not give them the same one.
+    by_name = {}
+
+    def node_named(name):
+        node = by_name.get(name)
+        if node is None:
+            node = by_name[name] = nodes[name]
+        return node
+
+    for move in plan.moves:
+        node_named(move.name).location = (move.x, move.y)
+
+    for reroute in plan.new_reroutes:
+        node = nodes.new('NodeReroute')
+        node.location = (reroute.x, reroute.y)
+        by_name[reroute.name] = node
+
+    # One pass over the links rather than reading socket.links for each one, which in Blender walks the
+    # whole link list every time. Given the SelectionScope the plan was made from, only its links are
+    # looked at, since the plan can't remove any others.
+    if len(plan.removed_links) > 0:
+        removed = set(plan.removed_links)
+        if scope is None:
+            found = [link for link in links if link_ref(link) in removed]
+        else:
+            found = [link for link, from_name, to_name in scope.links
+                     if LinkRef(from_name, link.from_socket.identifier, to_name, link.to_socket.identifier) in removed]
+        for link in found:
+            links.remove(link)
+
+    for name in plan.removed_nodes:
+        nodes.remove(node_named(name))
+        del by_name[name]
+
+    for ref in plan.added_links:
+        from_socket = find_socket(node_named(ref.from_node).outputs, ref.from_socket)
+        to_socket = find_socket(node_named(ref.to_node).inputs, ref.to_socket)
+        links.new(from_socket, to_socket)
+
+    timer.lap('apply')
+
+
+# Plans and applies in one go. Returns the EditPlan that was applied, or None if there was nothing to do.
+def square_noodles(nodes, links, tolerance=5.0, nudge_limit=100.0, noodle_margin=20.0, ui_scale=1.0,
+                   compact=False, timings=None, fan_out=False):
+
+    plan = plan_square_noodles(nodes, links, tolerance, nudge_limit, noodle_margin, ui_scale, compact, timings,
+                               fan_out=fan_out)
+    if plan is not None:
+        apply_plan(plan, nodes, links, timings)
+    return plan
+
+
+def plan_job(job):
+    key, tree, settings = job
+    return key, plan_square_noodles(tree.nodes, tree.links, **settings)
+
+
+# Trees with fewer links than this are planned in this process even when there is a pool, pickling them
+# over to a worker would take longer than just planning them.
+POOL_MIN_LINKS = 200
+
+
+# Plans a whole batch of trees, spread over a pool of worker processes. snapshots is an iterable of
+# (key, MockTree) pairs and (key, EditPlan or None) pairs come back in whatever order they finish, so the
+# caller can start applying plans while the rest are still being worked out. Everything else is passed
+# on to plan_square_noodles. With one worker (or only small trees) it all just runs in this process.
+def plan_many(snapshots, workers=None, **settings):
+    jobs = [(key, tree, settings) for key, tree in snapshots]
+    large = [job for job in jobs if len(job[1].links) >= POOL_MIN_LINKS]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(large))
+
+    if workers <= 1:
+        for job in jobs:
+            yield plan_job(job)
+        return
+
+    # spawn rather than fork, forking Blender itself is asking for trouble
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        results = pool.imap_unordered(plan_job, large)
+        # the small trees get planned here while the workers chew on the big ones
+        for job in jobs:
+            if len(job[1].links) < POOL_MIN_LINKS:
+                yield plan_job(job)
+        yield from results
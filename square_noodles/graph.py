@@ -0,0 +1,125 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# A portable JSON format for node trees, so real graphs can be saved out of Blender and then squared,
+# archived or compared without it. A graph file looks like:
+#
+#     {"format": "square-noodles-graph", "version": 1, "name": "Material", "bl_idname": "ShaderNodeTree",
+#      "nodes": [{"name": "Math", "bl_idname": "ShaderNodeMath", "type": "MATH", "location": [0.0, 0.0],
+#                 "dimensions": [140.0, 146.0], "hide": false, "select": true,
+#                 "inputs": [{"identifier": "Value", "name": "Value", "type": "VALUE", ...}, ...],
+#                 "outputs": [...]}, ...],
+#      "links": [["Math", "Value", "Math.001", "Value_001"], ...]}
+#
+# Links are [from_node, from_socket, to_node, to_socket] by node name and socket identifier. Every socket
+# also gets hidden, tall and linked flags as they were when it was saved. Those are worked out from the
+# rest and ignored when loading, they are there to make it easy to see why a socket ended up where it did.
+
+import json
+
+from .core import LinkIndex, is_hidden, is_tall
+from .mock import MockTree
+
+FORMAT = 'square-noodles-graph'
+VERSION = 1
+
+
+def socket_to_dict(node, socket, link_index):
+    return {
+        'identifier': socket.identifier,
+        'name': socket.name,
+        'type': socket.type,
+        'hide': socket.hide,
+        'enabled': socket.enabled,
+        'hide_value': socket.hide_value,
+        'is_multi_input': socket.is_multi_input,
+        'hidden': is_hidden(socket),
+        'tall': is_tall(node, socket, link_index),
+        'linked': link_index.is_linked(node, socket),
+    }
+
+
+# Reads anything shaped like a node tree (a real bpy one or a MockTree) into plain dicts and lists
+def tree_to_dict(nodes, links, name='NodeTree', bl_idname='ShaderNodeTree'):
+    link_index = LinkIndex(links)
+    return {
+        'format': FORMAT,
+        'version': VERSION,
+        'name': name,
+        'bl_idname': bl_idname,
+        'nodes': [{
+            'name': node.name,
+            'bl_idname': node.bl_idname,
+            'type': node.type,
+            'location': list(node.location),
+            'dimensions': list(node.dimensions),
+            'hide': node.hide,
+            'select': node.select,
+            'inputs': [socket_to_dict(node, socket, link_index) for socket in node.inputs],
+            'outputs': [socket_to_dict(node, socket, link_index) for socket in node.outputs],
+        } for node in nodes],
+        'links': [[link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier]
+                  for link in links],
+    }
+
+
+# Builds a MockTree back out of tree_to_dict's output. Raises ValueError if it isn't a graph this version
+# knows how to read, or anything in it isn't shaped the way tree_to_dict writes it (including a link to a
+# node or socket that isn't there).
+def tree_from_dict(data, select_all=False):
+    if not isinstance(data, dict):
+        raise ValueError(f'not a square noodles graph (a {type(data).__name__}, not an object)')
+    if data.get('format') != FORMAT:
+        raise ValueError(f"not a square noodles graph (format {data.get('format')!r})")
+    version = data.get('version', 0)
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError(f'malformed graph (version {version!r} is not a whole number)')
+    if version > VERSION:
+        raise ValueError(f"graph version {data['version']} is newer than this reader ({VERSION})")
+
+    try:
+        tree = MockTree(str(data.get('name', 'NodeTree')), str(data.get('bl_idname', 'ShaderNodeTree')))
+        sockets = {}
+        for entry in data['nodes']:
+            node = tree.nodes.new(entry['bl_idname'], name=entry['name'], node_type=entry.get('type'),
+                                  location=read_pair(entry['location']), dimensions=read_pair(entry['dimensions']),
+                                  hide=bool(entry.get('hide', False)),
+                                  select=select_all or bool(entry.get('select', False)))
+            node.inputs, node.outputs = [], []
+            for key, add, is_output in (('inputs', node.add_input, False), ('outputs', node.add_output, True)):
+                for socket in entry.get(key, []):
+                    sockets[node.name, socket['identifier'], is_output] = add(
+                        socket['identifier'], name=socket.get('name'), type=socket.get('type', 'VALUE'),
+                        hide=bool(socket.get('hide', False)), enabled=bool(socket.get('enabled', True)),
+                        hide_value=bool(socket.get('hide_value', False)),
+                        is_multi_input=bool(socket.get('is_multi_input', False)))
+        for from_node, from_socket, to_node, to_socket in data['links']:
+            tree.links.new(sockets[from_node, from_socket, True], sockets[to_node, to_socket, False])
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+        raise ValueError(f'malformed graph ({type(e).__name__}: {e})') from e
+    return tree
+
+
+def read_pair(value):
+    x, y = value
+    return float(x), float(y)
+
+
+def save_graph(path, nodes, links, name='NodeTree', bl_idname='ShaderNodeTree'):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tree_to_dict(nodes, links, name, bl_idname), f, separators=(',', ':'))
+
+
+def load_graph(path, select_all=False):
+    with open(path, encoding='utf-8') as f:
+        return tree_from_dict(json.load(f), select_all)
@@ -0,0 +1,323 @@
+
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+# An in-memory stand-in for bpy.types.NodeTree. It only implements the parts of the Blender API
+# the square noodles code touches, so the planner can be run, tested and timed without Blender.
+
+
+class MockVector:
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = float(x)
+        self.y = float(y)
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __getitem__(self, idx):
+        return (self.x, self.y)[idx]
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f'MockVector(({self.x}, {self.y}))'
+
+
+class MockSocket:
+
+    def __init__(self, node, identifier, is_output, type='VALUE', hide=False, enabled=True,
+                 hide_value=False, is_multi_input=False, name=None):
+        self.node = node
+        self.identifier = identifier
+        self.name = identifier if name is None else name
+        self.is_output = is_output
+        self.type = type
+        self.hide = hide
+        self.enabled = enabled
+        self.hide_value = hide_value
+        self.is_multi_input = is_multi_input
+
+    # Like NodeSocket.links in Blender, this walks the whole link list of the tree on every access.
+    @property
+    def links(self):
+        return tuple(link for link in self.node.tree.links
+                     if link.from_socket is self or link.to_socket is self)
+
+    @property
+    def is_linked(self):
+        return len(self.links) > 0
+
+    def __repr__(self):
+        direction = 'output' if self.is_output else 'input'
+        return f'<MockSocket {self.node.name}.{direction}[{self.identifier!r}]>'
+
+
+class MockNode:
+
+    def __init__(self, tree, name, bl_idname, node_type=None, location=(0.0, 0.0), dimensions=(140.0, 100.0),
+                 hide=False, select=False):
+        self.tree = tree
+        self.name = name
+        self.bl_idname = bl_idname
+        self.type = node_type if node_type is not None else ('REROUTE' if bl_idname == 'NodeReroute' else bl_idname)
+        self._location = MockVector(*location)
+        self._dimensions = MockVector(*dimensions)
+        self.hide = hide
+        self.select = select
+        self.inputs = []
+        self.outputs = []
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, value):
+        self._location = MockVector(*value)
+
+    @property
+    def dimensions(self):
+        return self._dimensions
+
+    @dimensions.setter
+    def dimensions(self, value):
+        self._dimensions = MockVector(*value)
+
+    def add_input(self, identifier, **kwargs):
+        socket = MockSocket(self, identifier, False, **kwargs)
+        self.inputs.append(socket)
+        return socket
+
+    def add_output(self, identifier, **kwargs):
+        socket = MockSocket(self, identifier, True, **kwargs)
+        self.outputs.append(socket)
+        return socket
+
+    def __repr__(self):
+        return f'<MockNode {self.name!r} {self.bl_idname}>'
+
+
+class MockNodes(list):
+
+    def __init__(self, tree):
+        super().__init__()
+        self.tree = tree
+        self.active = None
+        self.by_name = {}
+        self.name_counters = {}
+        # Names taken by nodes of the original tree that were left out of a partial copy
+        self.reserved = set()
+        # Where the reroutes of the original tree whose input link was left out of a partial copy were fed
+        # from, as (node name, socket identifier, whether that node is a reroute)
+        self.feeds = {}
+
+    # Blender-style unique names: "Reroute", "Reroute.001", "Reroute.002"...
+    def _unique_name(self, base):
+        if base not in self.by_name and base not in self.reserved:
+            return base
+        counter = self.name_counters.get(base, 0)
+        while True:
+            counter += 1
+            name = f'{base}.{counter:03d}'
+            if name not in self.by_name and name not in self.reserved:
+                self.name_counters[base] = counter
+                return name
+
+    # Mirrors bpy's nodes.new(type). Anything other than a reroute starts out with no sockets,
+    # use MockNode.add_input/add_output to build them up.
+    def new(self, type, name=None, **kwargs):
+        if name is None:
+            name = 'Reroute' if type == 'NodeReroute' else type
+        node = MockNode(self.tree, self._unique_name(name), type, **kwargs)
+        if type == 'NodeReroute':
+            # Blender reroutes report zero-size dimensions until they have been drawn
+            node.dimensions = (0.0, 0.0)
+            node.add_input('Input', type='RGBA')
+            node.add_output('Output', type='RGBA')
+        self.append(node)
+        self.by_name[node.name] = node
+        return node
+
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.by_name[key]
+        return super().__getitem__(key)
+
+    def remove(self, node):
+        links = self.tree.links
+        for link in [l for s in node.inputs for l in links.into.get(s, ())] + \
+                [l for s in node.outputs for l in links.out_of.get(s, ())]:
+            if link in links:
+                links.remove(link)
+        super().remove(node)
+        del self.by_name[node.name]
+
+
+class MockLink:
+
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+
+    @property
+    def from_node(self):
+        return self.from_socket.node
+
+    @property
+    def to_node(self):
+        return self.to_socket.node
+
+    def __repr__(self):
+        return f'<MockLink {self.from_socket!r} -> {self.to_socket!r}>'
+
+
+class MockLinks:
+
+    # Links are kept in an insertion-ordered dict so that iterating them matches the order they were made
+    # in (like Blender), while creating and removing a link stays cheap on trees with thousands of links.
+    # Everything is keyed on the objects themselves rather than their id()s so that trees can be pickled.
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.links = {}
+        self.by_sockets = {}
+        self.into = {}
+        self.out_of = {}
+
+    def __iter__(self):
+        return iter(list(self.links))
+
+    def __len__(self):
+        return len(self.links)
+
+    def __getitem__(self, idx):
+        return list(self.links)[idx]
+
+    def __contains__(self, link):
+        return link in self.links
+
+    # Mirrors bpy's links.new(input, output): sockets may be passed in either order, and linking
+    # into an input that isn't multi-input replaces whatever was linked there before.
+    def new(self, input, output):
+        from_socket, to_socket = input, output
+        if from_socket.is_output is False and to_socket.is_output is True:
+            from_socket, to_socket = to_socket, from_socket
+        existing = self.by_sockets.get((from_socket, to_socket))
+        if existing is not None:
+            return existing
+        if not to_socket.is_multi_input:
+            for link in list(self.into.get(to_socket, ())):
+                self.remove(link)
+        link = MockLink(from_socket, to_socket)
+        self.links[link] = None
+        self.by_sockets[(from_socket, to_socket)] = link
+        self.into.setdefault(to_socket, []).append(link)
+        self.out_of.setdefault(from_socket, {})[link] = None
+        return link
+
+    def remove(self, link):
+        del self.links[link]
+        del self.by_sockets[(link.from_socket, link.to_socket)]
+        self.into[link.to_socket].remove(link)
+        del self.out_of[link.from_socket][link]
+
+
+class MockTree:
+
+    def __init__(self, name='NodeTree', bl_idname='ShaderNodeTree'):
+        self.name = name
+        self.bl_idname = bl_idname
+        self.nodes = MockNodes(self)
+        self.links = MockLinks(self)
+
+
+def copy_node(tree, node, sockets, select):
+    copy = tree.nodes.new(node.bl_idname, name=node.name, node_type=node.type,
+                          location=tuple(node.location), dimensions=tuple(node.dimensions),
+                          hide=node.hide, select=select)
+    copy.dimensions = tuple(node.dimensions)
+    copy.inputs, copy.outputs = [], []
+    copied = {}
+    for socket in sockets:
+        add = copy.add_output if socket.is_output else copy.add_input
+        copied[node.name, socket.identifier, socket.is_output] = add(
+            socket.identifier, type=socket.type, hide=socket.hide, enabled=socket.enabled,
+            hide_value=socket.hide_value, is_multi_input=socket.is_multi_input, name=socket.name)
+    return copied
+
+
+# Copies anything shaped like a node tree (a real bpy one, or another MockTree) into a new MockTree,
+# reading every property the planner needs exactly once. This is the frozen snapshot planning runs on.
+# With select_all, every node in the copy is selected regardless of the original.
+#
+# Given scope (a core.SelectionScope), the tree is read through it rather than from nodes and links, and
+# only the nodes in scope.names are copied in full, along with scope.links. The node at the far end of
+# such a link comes along as a stand-in, with only the sockets those links use (all of them for a
+# reroute), so the sockets in scope still know they're linked. Everything else is left out, but its name
+# stays taken, and where any reroute whose input link was left out gets its signal from is kept in
+# tree.nodes.feeds.
+def copy_tree(nodes, links, name='Snapshot', select_all=False, scope=None):
+    tree = MockTree(name)
+    sockets = {}
+
+    if scope is None:
+        for node in nodes:
+            sockets.update(copy_node(tree, node, [*node.inputs, *node.outputs], select_all or node.select))
+        for link in links:
+            tree.links.new(sockets[link.from_node.name, link.from_socket.identifier, True],
+                           sockets[link.to_node.name, link.to_socket.identifier, False])
+        return tree
+
+    stand_ins = {}
+    for link, from_name, to_name in scope.links:
+        if from_name not in scope.names:
+            stand_ins.setdefault(from_name, {})[link.from_socket.identifier, True] = link.from_socket
+        if to_name not in scope.names:
+            stand_ins.setdefault(to_name, {})[link.to_socket.identifier, False] = link.to_socket
+    reroutes = {node_name for _, node_name, bl_idname in scope.nodes if bl_idname == 'NodeReroute'}
+    for link, from_name, to_name in scope.outside:
+        if to_name in reroutes:
+            tree.nodes.feeds[to_name] = (from_name, link.from_socket.identifier, from_name in reroutes)
+
+    for node, node_name, bl_idname in scope.nodes:
+        if node_name in scope.names:
+            sockets.update(copy_node(tree, node, [*node.inputs, *node.outputs], select_all or node.select))
+        elif node_name in stand_ins:
+            if bl_idname == 'NodeReroute':
+                sockets.update(copy_node(tree, node, [*node.inputs, *node.outputs], False))
+            else:
+                sockets.update(copy_node(tree, node, stand_ins[node_name].values(), False))
+        else:
+            tree.nodes.reserved.add(node_name)
+    for link, from_name, to_name in scope.links:
+        tree.links.new(sockets[from_name, link.from_socket.identifier, True],
+                       sockets[to_name, link.to_socket.identifier, False])
+    return tree
+
+
+# Adds nodes that copy_tree left out of a partial copy back into it, unselected and without any links.
+# Reroutes keep their sockets so that they can still be found and linked into, everything else only
+# comes back as something to steer around.
+def add_outlines(tree, nodes):
+    for node in nodes:
+        tree.nodes.reserved.discard(node.name)
+        copy_node(tree, node, [*node.inputs, *node.outputs] if node.bl_idname == 'NodeReroute' else [], False)
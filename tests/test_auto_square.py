@@ -0,0 +1,235 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import importlib
+import sys
+import types
+
+import pytest
+
+from square_noodles import core, mock
+
+
+def chain_tree():
+    tree = mock.MockTree()
+    previous = None
+    for i in range(4):
+        node = tree.nodes.new('ShaderNodeMath', location=(i * 300, (i % 2) * 150))
+        node.add_input('Value')
+        node.add_output('Value')
+        if previous is not None:
+            tree.links.new(previous.outputs[0], node.inputs[0])
+        previous = node
+    return tree
+
+
+def test_link_tracker_reports_new_and_moved_links():
+    tree = chain_tree()
+    first, second, third, fourth = tree.nodes
+    tracker = core.LinkTracker()
+    assert tracker.update(tree.nodes, tree.links) == []
+    assert tracker.update(tree.nodes, tree.links) == []
+
+    second.location = (second.location.x, second.location.y + 50)
+    assert set(tracker.update(tree.nodes, tree.links)) == {core.link_ref(link) for link in tree.links
+                                                           if second in (link.from_node, link.to_node)}
+    assert tracker.update(tree.nodes, tree.links) == []
+
+    # a new link is reported, one that went away isn't
+    link = tree.links.new(first.outputs[0], fourth.inputs[0])
+    assert tracker.update(tree.nodes, tree.links) == [core.link_ref(link)]
+    tree.links.remove(link)
+    assert tracker.update(tree.nodes, tree.links) == []
+
+    # collapsing a node moves its sockets without the node going anywhere
+    third.hide = True
+    assert set(tracker.update(tree.nodes, tree.links)) == {core.link_ref(link) for link in tree.links
+                                                           if third in (link.from_node, link.to_node)}
+
+
+# bpy.ops.ed.undo_push, which like the real one can only run with a screen in the context
+class UndoPush:
+
+    def __init__(self, undo_steps, overrides):
+        self.undo_steps = undo_steps
+        self.overrides = overrides
+
+    def poll(self):
+        return len(self.overrides) > 0 and self.overrides[-1].get('screen') is not None
+
+    def __call__(self, message):
+        if not self.poll():
+            raise RuntimeError('Operator bpy.ops.ed.undo_push.poll() failed, context is incorrect')
+        self.undo_steps.append(message)
+
+
+class Override:
+
+    def __init__(self, overrides, kwargs):
+        self.overrides = overrides
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        self.overrides.append(self.kwargs)
+
+    def __exit__(self, *args):
+        self.overrides.pop()
+
+
+# Just enough of bpy for blender.py to import and for its handler and timer to run against mock trees
+@pytest.fixture
+def blender(monkeypatch):
+    bpy = types.ModuleType('bpy')
+    bpy.props = types.SimpleNamespace(**{kind: lambda **kwargs: kwargs.get('default')
+                                         for kind in ('BoolProperty', 'FloatProperty', 'IntProperty',
+                                                      'StringProperty')})
+    bpy.types = types.SimpleNamespace(Operator=type('Operator', (), {}),
+                                      AddonPreferences=type('AddonPreferences', (), {}))
+    bpy.app = types.ModuleType('bpy.app')
+    bpy.app.handlers = types.ModuleType('bpy.app.handlers')
+    bpy.app.handlers.persistent = lambda function: function
+    timers = {}
+    bpy.app.timers = types.SimpleNamespace(
+        register=lambda function, first_interval: timers.update({function: first_interval}),
+        is_registered=lambda function: function in timers,
+        unregister=lambda function: timers.pop(function))
+    undo_steps = []
+    overrides = []
+    bpy.ops = types.SimpleNamespace(ed=types.SimpleNamespace(undo_push=UndoPush(undo_steps, overrides)))
+    window = types.SimpleNamespace(screen=types.SimpleNamespace())
+    bpy.context = types.SimpleNamespace(window_manager=types.SimpleNamespace(windows=[window]),
+                                        temp_override=lambda **kwargs: Override(overrides, kwargs))
+    bpy.data = types.SimpleNamespace(materials=[], worlds=[], lights=[], textures=[], linestyles=[], scenes=[],
+                                     node_groups=[])
+    bpy_extras = types.ModuleType('bpy_extras')
+    bpy_extras.io_utils = types.ModuleType('bpy_extras.io_utils')
+    bpy_extras.io_utils.ExportHelper = type('ExportHelper', (), {})
+    for module in (bpy, bpy.app, bpy.app.handlers, bpy_extras, bpy_extras.io_utils):
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+    monkeypatch.delitem(sys.modules, 'square_noodles.blender', raising=False)
+    blender = importlib.import_module('square_noodles.blender')
+    monkeypatch.delitem(sys.modules, 'square_noodles.blender')
+    return blender, bpy, timers, undo_steps
+
+
+class Depsgraph:
+
+    def __init__(self, *id_types):
+        self.id_types = id_types
+
+    def id_type_updated(self, id_type):
+        return id_type in self.id_types
+
+
+def auto_tree(blender, bpy):
+    tree = chain_tree()
+    tree.as_pointer = lambda: id(tree)
+    tree.library = None
+    bpy.data.node_groups.append(tree)
+    tracker = core.LinkTracker()
+    tracker.update(tree.nodes, tree.links)
+    blender.auto_trees[tree.as_pointer()] = {'tracker': tracker, 'tolerance': 5.0, 'nudge_limit': 100.0,
+                                             'noodle_margin': 20.0, 'compact': False, 'fan_out': False}
+    return tree
+
+
+def test_handler_waits_for_one_timer(blender):
+    blender, bpy, timers, undo_steps = blender
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    assert timers == {}
+
+    auto_tree(blender, bpy)
+    blender.auto_square_handler(None, Depsgraph('OBJECT'))
+    assert timers == {}
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    blender.auto_square_handler(None, Depsgraph('MATERIAL'))
+    assert timers == {blender.auto_square_trees: blender.AUTO_DELAY}
+    assert blender.auto_state['waiting']
+    blender.auto_square_reset()
+
+
+def test_timer_squares_what_moved_as_one_undo_step(blender):
+    blender, bpy, timers, undo_steps = blender
+    tree = auto_tree(blender, bpy)
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+
+    # still being edited
+    assert blender.auto_square_trees() > 0
+    assert blender.auto_state['waiting']
+
+    blender.auto_state['last_change'] -= blender.AUTO_DELAY
+    assert blender.auto_square_trees() is None
+    assert not blender.auto_state['waiting']
+    assert undo_steps == []
+
+    tree.nodes[1].location = (300, 400)
+    blender.auto_state['last_change'] -= blender.AUTO_DELAY
+    blender.auto_square_trees()
+    assert undo_steps == ['Auto Square Noodles']
+    assert len(tree.nodes) > 4
+    blender.auto_square_reset()
+
+
+# Undo puts the tree back the way it was before it was squared. That mustn't look like an edit, or the
+# undone squaring would just be done again.
+def test_undoing_an_auto_square_doesnt_square_again(blender):
+    blender, bpy, timers, undo_steps = blender
+    tree = auto_tree(blender, bpy)
+    tree.nodes[1].location = (300, 400)
+    before = mock.copy_tree(tree.nodes, tree.links)
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    blender.auto_state['last_change'] -= blender.AUTO_DELAY
+    blender.auto_square_trees()
+    assert len(tree.nodes) > 4
+
+    # undo swaps the squared tree for the one from before, under the same pointer
+    restored = mock.copy_tree(before.nodes, before.links)
+    restored.as_pointer, restored.library = tree.as_pointer, None
+    bpy.data.node_groups[:] = [restored]
+    blender.auto_square_undo()
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    blender.auto_state['last_change'] -= blender.AUTO_DELAY
+    blender.auto_square_trees()
+    assert len(restored.nodes) == 4
+    assert undo_steps == ['Auto Square Noodles']
+    blender.auto_square_reset()
+
+
+# With no window to borrow a screen from, the squaring still happens, just without an undo step of its own
+def test_timer_without_a_window_squares_without_an_undo_step(blender):
+    blender, bpy, timers, undo_steps = blender
+    bpy.context.window_manager.windows.clear()
+    tree = auto_tree(blender, bpy)
+    tree.nodes[1].location = (300, 400)
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    blender.auto_state['last_change'] -= blender.AUTO_DELAY
+    assert blender.auto_square_trees() is None
+    assert undo_steps == []
+    assert len(tree.nodes) > 4
+    blender.auto_square_reset()
+
+
+# Loading a file throws away any timer that was pending, so the handler mustn't go on thinking there is one
+def test_loading_a_file_while_waiting_starts_over(blender):
+    blender, bpy, timers, undo_steps = blender
+    auto_tree(blender, bpy)
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    blender.auto_square_reset()
+    assert blender.auto_trees == {} and timers == {}
+    assert not blender.auto_state['waiting']
+
+    auto_tree(blender, bpy)
+    blender.auto_square_handler(None, Depsgraph('NODETREE'))
+    assert timers == {blender.auto_square_trees: blender.AUTO_DELAY}
+    blender.auto_square_reset()
@@ -0,0 +1,59 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import random
+
+import pytest
+
+from square_noodles.core import Channel, allocate_channels
+
+
+def channel(x, y_min, y_max, source, x_min=-1000.0, x_max=1000.0):
+    return Channel(x, x_min, x_max, y_min, y_max, source, ())
+
+
+def test_overlapping_channels_get_lanes_margin_apart():
+    xs = allocate_channels([channel(0, 0, 100, 'a'), channel(5, 50, 150, 'b'), channel(-5, 20, 80, 'c')], 20)
+    assert sorted(xs) == pytest.approx([-20, 0, 20])
+
+
+def test_channels_share_a_lane_when_they_can():
+    # one output's channels are a single trunk, and channels that don't overlap in y can line up
+    assert allocate_channels([channel(0, 0, 100, 'a'), channel(5, 50, 150, 'a')], 20) == [2.5, 2.5]
+    xs = allocate_channels([channel(0, 0, 100, 'a'), channel(5, 200, 300, 'b')], 20)
+    assert xs[0] == xs[1]
+
+
+def test_far_apart_channels_stay_where_they_are():
+    assert allocate_channels([channel(0, 0, 100, 'a'), channel(500, 0, 100, 'b')], 20) == [0, 500]
+
+
+def test_lanes_that_dont_fit_are_squeezed_into_the_shared_range():
+    channels = [channel(50, 0, 100, source, x_min=40, x_max=60) for source in 'abc']
+    xs = allocate_channels(channels, 20)
+    assert sorted(xs) == pytest.approx([45, 50, 55])
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_channels_never_leave_their_range(seed):
+    rng = random.Random(seed)
+    channels = []
+    for _ in range(rng.randint(1, 30)):
+        x_min = rng.uniform(-500, 400)
+        x_max = x_min + rng.uniform(0, 300)
+        y_min = rng.uniform(-500, 500)
+        channels.append(Channel(rng.uniform(x_min, x_max), x_min, x_max, y_min, y_min + rng.uniform(0, 300),
+                                rng.randrange(10), ()))
+    xs = allocate_channels(channels, rng.choice([5, 20, 50]))
+    assert all(c.x_min <= x <= c.x_max for c, x in zip(channels, xs))
@@ -0,0 +1,123 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import random
+
+import pytest
+
+from square_noodles import core, mock
+
+from .trees import off_axis_links, random_tree, signals
+
+
+# A Math node feeding one input of each of the given Math nodes, with the output's position for
+# lining reroutes up against
+def fed_tree(*targets):
+    tree = mock.MockTree()
+    source = tree.nodes.new('ShaderNodeMath', location=(0, 0))
+    source.add_output('Value')
+    for x, y in targets:
+        target = tree.nodes.new('ShaderNodeMath', location=(x, y))
+        target.add_input('Value')
+    output = core.get_socket_dict(source, core.LinkIndex(tree.links))['output']['Value']
+    return tree, source, list(tree.nodes)[1:], output
+
+
+def reroute(tree, location, feeder):
+    node = tree.nodes.new('NodeReroute', location=location)
+    tree.links.new(feeder.outputs[0], node.inputs[0])
+    return node
+
+
+def test_reroutes_on_a_straight_noodle_are_spliced_out():
+    tree, source, (target,), output = fed_tree((600, 0))
+    end = core.get_socket_dict(target, core.LinkIndex(tree.links))['input']['Value']
+    target.location = (target.location.x, target.location.y + output.y - end.y)
+    first = reroute(tree, (output.x + 100, output.y), source)
+    second = reroute(tree, (output.x + 300, output.y), first)
+    tree.links.new(second.outputs[0], target.inputs[0])
+
+    assert core.compact_reroutes(tree.nodes, tree.links) == 2
+    assert [node.name for node in tree.nodes] == [source.name, target.name]
+    assert [(link.from_node, link.to_node) for link in tree.links] == [(source, target)]
+
+
+def test_reroutes_stacked_on_the_same_socket_are_merged():
+    tree, source, (top, bottom), output = fed_tree((600, 300), (600, -600))
+    corner = (output.x + 200, output.y - 200)
+    kept = reroute(tree, corner, source)
+    stacked = reroute(tree, (corner[0] + 1, corner[1] - 1), source)
+    tree.links.new(kept.outputs[0], top.inputs[0])
+    tree.links.new(stacked.outputs[0], bottom.inputs[0])
+    before = signals(tree)
+
+    assert core.compact_reroutes(tree.nodes, tree.links) == 1
+    assert [node.name for node in tree.nodes if node.bl_idname == 'NodeReroute'] == [kept.name]
+    assert signals(tree) == before
+
+
+# A reroute stacked a few units off one that's kept, feeding an input straight below it. Handing its noodle
+# over to the kept reroute would add the two offsets together and knock the noodle off its axis.
+@pytest.mark.parametrize('seed', range(20))
+def test_merging_never_knocks_an_aligned_noodle_off_axis(seed):
+    rng = random.Random(seed)
+    tree, source, (below,), output = fed_tree((0, -600))
+    corner = (output.x + 200, output.y)
+    reroute(tree, corner, source)
+    stacked = reroute(tree, (corner[0] + rng.uniform(3, 4.9), corner[1] - rng.uniform(0, 4.9)), source)
+    end = core.get_socket_dict(below, core.LinkIndex(tree.links))['input']['Value']
+    shift = stacked.location.x + rng.uniform(2, 4.9) - end.x
+    below.location = (below.location.x + shift, below.location.y)
+    tree.links.new(stacked.outputs[0], below.inputs[0])
+    names = {node.name for node in tree.nodes}
+    assert off_axis_links(tree, names) == []
+
+    core.compact_reroutes(tree.nodes, tree.links)
+    assert off_axis_links(tree, names) == []
+
+
+def test_merging_stacked_reroutes_through_the_planner_keeps_noodles_aligned():
+    tree, source, (below,), output = fed_tree((0, -600))
+    corner = (output.x + 200, output.y)
+    reroute(tree, corner, source)
+    stacked = reroute(tree, (corner[0] + 4, corner[1] - 4), source)
+    end = core.get_socket_dict(below, core.LinkIndex(tree.links))['input']['Value']
+    below.location = (below.location.x + corner[0] + 7 - end.x, below.location.y)
+    tree.links.new(stacked.outputs[0], below.inputs[0])
+    for node in tree.nodes:
+        node.select = True
+    names = {node.name for node in tree.nodes}
+    assert off_axis_links(tree, names) == []
+
+    core.square_noodles(tree.nodes, tree.links, compact=True)
+    assert off_axis_links(tree, names) == []
+
+
+def test_only_removable_reroutes_are_touched():
+    tree, source, (target,), output = fed_tree((600, 0))
+    first = reroute(tree, (output.x + 100, output.y), source)
+    tree.links.new(first.outputs[0], target.inputs[0])
+    assert core.compact_reroutes(tree.nodes, tree.links, removable=set()) == 0
+    assert len(tree.nodes) == 3
+
+
+# The plan's count of removed reroutes is exactly how many the tree is down once it's applied
+@pytest.mark.parametrize('seed', range(20))
+def test_plan_counts_the_reroutes_compaction_removed(seed):
+    tree = random_tree(seed, 40)
+    for run in range(2):
+        before = sum(node.bl_idname == 'NodeReroute' for node in tree.nodes)
+        counts = core.square_noodles(tree.nodes, tree.links, compact=True).counts()
+        after = sum(node.bl_idname == 'NodeReroute' for node in tree.nodes)
+        assert after == before + counts['reroutes_created'] - counts['reroutes_removed']
@@ -0,0 +1,98 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import json
+
+import pytest
+
+from square_noodles import cli, core
+from square_noodles.graph import load_graph, save_graph, tree_from_dict, tree_to_dict
+
+from .trees import dump, random_tree
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_graphs_round_trip(tmp_path, seed):
+    tree = random_tree(seed, 40)
+    save_graph(tmp_path / 'tree.json', tree.nodes, tree.links)
+    loaded = load_graph(tmp_path / 'tree.json')
+    assert dump(loaded) == dump(tree)
+    assert tree_to_dict(loaded.nodes, loaded.links) == tree_to_dict(tree.nodes, tree.links)
+    # and it plans the same as the tree it came from
+    assert core.plan_square_noodles(loaded.nodes, loaded.links).to_dict() == \
+        core.plan_square_noodles(tree.nodes, tree.links).to_dict()
+
+
+def test_select_all_selects_every_node():
+    tree = random_tree(0, 20, selected=0.0)
+    assert not any(node.select for node in tree_from_dict(tree_to_dict(tree.nodes, tree.links)).nodes)
+    assert all(node.select for node in tree_from_dict(tree_to_dict(tree.nodes, tree.links), select_all=True).nodes)
+
+
+def test_socket_flags_are_read_as_bools():
+    tree = random_tree(0, 10)
+    data = tree_to_dict(tree.nodes, tree.links)
+    for entry in data['nodes']:
+        for socket in entry['inputs'] + entry['outputs']:
+            socket.update(hide=0, enabled=1, hide_value=0, is_multi_input=0)
+    for node in tree_from_dict(data).nodes:
+        for socket in list(node.inputs) + list(node.outputs):
+            flags = (socket.hide, socket.enabled, socket.hide_value, socket.is_multi_input)
+            assert [type(flag) for flag in flags] == [bool] * 4
+            assert flags == (False, True, False, False)
+
+
+def malformed_graphs():
+    tree = random_tree(0, 10)
+    good = tree_to_dict(tree.nodes, tree.links)
+    yield []
+    yield dict(good, format='something else')
+    yield dict(good, version=good['version'] + 1)
+    yield dict(good, version=str(good['version']))
+    yield dict(good, version=None)
+    yield {key: value for key, value in good.items() if key != 'nodes'}
+    yield dict(good, nodes=[dict(good['nodes'][0], location=[0.0])])
+    yield dict(good, links=[['Nowhere', 'Value', good['nodes'][0]['name'], 'In0']])
+
+
+@pytest.mark.parametrize('data', list(malformed_graphs()))
+def test_malformed_graphs_raise_value_error(data):
+    with pytest.raises(ValueError):
+        tree_from_dict(data)
+
+
+# A file that can't be read gets a line with its error, the rest still get planned, and the exit status
+# says something went wrong
+def test_cli_reports_bad_files_and_carries_on(tmp_path, capsys):
+    tree = random_tree(0, 20)
+    save_graph(tmp_path / 'good.json', tree.nodes, tree.links)
+    (tmp_path / 'bad.json').write_text('{"format": "square-noodles-graph", "nodes": []}', encoding='utf-8')
+    (tmp_path / 'broken.json').write_text('{', encoding='utf-8')
+
+    assert cli.main([str(tmp_path), '--workers', '1', '--plans']) == 1
+    results = {result['file']: result for result in map(json.loads, capsys.readouterr().out.splitlines())}
+    assert set(results) == {str(tmp_path / name) for name in ('bad.json', 'broken.json', 'good.json')}
+    assert results[str(tmp_path / 'bad.json')]['error'].startswith('ValueError: malformed graph')
+    assert results[str(tmp_path / 'broken.json')]['error'].startswith('JSONDecodeError')
+    good = results[str(tmp_path / 'good.json')]
+    assert 'error' not in good
+    loaded = load_graph(tmp_path / 'good.json', select_all=True)
+    assert good['plan'] == core.plan_square_noodles(loaded.nodes, loaded.links).to_dict()
+
+
+def test_cli_exits_cleanly_when_every_file_plans(tmp_path, capsys):
+    tree = random_tree(1, 20)
+    save_graph(tmp_path / 'good.json', tree.nodes, tree.links)
+    assert cli.main([str(tmp_path / 'good.json'), '--workers', '1']) == 0
+    assert 'error' not in json.loads(capsys.readouterr().out)
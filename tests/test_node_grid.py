@@ -0,0 +1,68 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+from square_noodles import core, mock
+
+from .trees import off_axis_links
+
+
+def grid_tree(*rects):
+    tree = mock.MockTree()
+    for x, y, width, height in rects:
+        tree.nodes.new('ShaderNodeMath', location=(x, y), dimensions=(width, height))
+    return tree
+
+
+def test_segment_blocked_by_overlap_not_by_touching():
+    grid = core.NodeGrid(grid_tree((0, 0, 100, 100)).nodes)
+    assert grid.segment_blocked((-50, -50), (150, -50))
+    assert not grid.segment_blocked((-50, 0), (150, 0))
+    assert not grid.segment_blocked((-50, -50), (150, -50), ignore={'ShaderNodeMath'})
+
+
+def test_clear_range_stops_at_nodes_beside_the_middle():
+    grid = core.NodeGrid(grid_tree((100, 50, 50, 200), (300, 50, 50, 200)).nodes)
+    root, target = core.Point(0, 0), core.Point(500, -100)
+    assert grid.clear_range(root, target, 200, 1000) == (150, 300)
+    # reach and the ends of the stairstep both limit it too
+    assert grid.clear_range(root, target, 200, 10) == (190, 210)
+    assert grid.clear_range(root, target, 200, 1000, ignore={'ShaderNodeMath'}) == (0, 300)
+
+
+# Blender gives nodes that have never been drawn zero dimensions. They used to shrink the cells to a
+# single unit, which made checking any segment crawl through every unit it crossed.
+def test_zero_size_nodes_are_left_out():
+    grid = core.NodeGrid(grid_tree((0, 0, 0, 0), (500, 0, 0, 0)).nodes)
+    assert grid.rects == [] and grid.cells == {}
+    assert grid.cell_size == 200.0
+
+    grid = core.NodeGrid(grid_tree((0, 0, 0, 0), (500, 0, 140, 100), (900, 0, 140, 100)).nodes)
+    assert grid.names == ['ShaderNodeMath.001', 'ShaderNodeMath.002']
+    assert grid.cell_size == 140.0
+    assert core.NodeGrid(grid_tree((0, 0, 1, 1)).nodes).cell_size == core.NodeGrid.MIN_CELL_SIZE
+
+
+def test_zero_size_chain_squares():
+    tree = mock.MockTree()
+    previous = None
+    for i in range(100):
+        node = tree.nodes.new('ShaderNodeMath', location=(i * 300, (i % 7) * 150), dimensions=(0, 0),
+                              select=True)
+        node.add_input('Value')
+        node.add_output('Value')
+        if previous is not None:
+            tree.links.new(previous.outputs[0], node.inputs[0])
+        previous = node
+    core.square_noodles(tree.nodes, tree.links)
+    assert off_axis_links(tree, {node.name for node in tree.nodes}) == []
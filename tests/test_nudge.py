@@ -0,0 +1,110 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import random
+
+import pytest
+
+from square_noodles import core, mock
+from square_noodles.core import AxisClasses
+
+from .trees import random_tree
+
+
+def nudge(tree, nudge_limit=100.0, tolerance=5.0):
+    link_index = core.LinkIndex(tree.links)
+    socket_dict = core.layout_sockets(tree.nodes, link_index)
+    core.nudge_reroutes([node for node in tree.nodes if node.select], socket_dict, link_index, nudge_limit, tolerance)
+    return {node.name: tuple(node.location) for node in tree.nodes}
+
+
+# A Math node whose output runs through a selected reroute at the given offset from it, into a Math node
+# level with the output
+def detour(dx, dy):
+    tree = mock.MockTree()
+    source = tree.nodes.new('ShaderNodeMath', location=(0, 0))
+    source.add_output('Value')
+    output = core.get_socket_dict(source, core.LinkIndex(tree.links))['output']['Value']
+    target = tree.nodes.new('ShaderNodeMath', location=(output.x + 600, 0))
+    target.add_input('Value')
+    end = core.get_socket_dict(target, core.LinkIndex(tree.links))['input']['Value']
+    target.location = (target.location.x, output.y - end.y)
+    reroute = tree.nodes.new('NodeReroute', location=(output.x + dx, output.y + dy), select=True)
+    tree.links.new(source.outputs[0], reroute.inputs[0])
+    tree.links.new(reroute.outputs[0], target.inputs[0])
+    return tree, reroute, output
+
+
+def test_reroutes_within_the_nudge_limit_line_up():
+    tree, reroute, output = detour(300, 40)
+    assert nudge(tree)[reroute.name] == (output.x + 300, output.y)
+
+
+def test_reroutes_past_the_nudge_limit_stay_put():
+    tree, reroute, output = detour(300, 40)
+    assert nudge(tree, nudge_limit=40)[reroute.name] == (output.x + 300, output.y + 40)
+
+
+def test_reroutes_already_within_tolerance_are_left_alone():
+    tree, reroute, output = detour(300, 3)
+    assert nudge(tree)[reroute.name] == (output.x + 300, output.y + 3)
+
+    # and so are two reroutes already lined up with each other
+    tree = mock.MockTree()
+    first = tree.nodes.new('NodeReroute', location=(0, 0), select=True)
+    second = tree.nodes.new('NodeReroute', location=(200, 2), select=True)
+    tree.links.new(first.outputs[0], second.inputs[0])
+    assert nudge(tree) == {first.name: (0, 0), second.name: (200, 2)}
+
+
+def test_classes_refuse_merges_past_the_nudge_limit_or_between_far_anchors():
+    classes = AxisClasses(nudge_limit=50, tolerance=5)
+    classes.add_reroute('a', 0)
+    classes.add_reroute('b', 60)
+    classes.add_reroute('c', 120)
+    assert classes.union('a', 'b')
+    assert classes.value('a') == classes.value('b') == 30
+    # c is 90 from the shared 30, and the anchor is 60 from a
+    assert not classes.union('b', 'c')
+    assert not classes.union('a', classes.add_anchor(90))
+    assert classes.union('a', classes.add_anchor(40))
+    assert classes.value('b') == 40
+    assert not classes.union('b', classes.add_anchor(46))
+    assert classes.value('c') is None
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('nudge_limit', [10.0, 50.0, 100.0])
+def test_no_reroute_moves_the_nudge_limit_or_more(seed, nudge_limit):
+    tree = random_tree(seed, 40)
+    before = {node.name: tuple(node.location) for node in tree.nodes}
+    after = nudge(tree, nudge_limit)
+    for name, (x, y) in after.items():
+        assert abs(x - before[name][0]) < nudge_limit
+        assert abs(y - before[name][1]) < nudge_limit
+
+
+# The same tree with its links made in a different order nudges the same way
+@pytest.mark.parametrize('seed', range(20))
+def test_nudging_doesnt_depend_on_link_order(seed):
+    tree = random_tree(seed, 40)
+    shuffled = random_tree(seed, 40)
+    links = list(shuffled.links)
+    random.Random(seed).shuffle(links)
+    ends = [(link.from_socket, link.to_socket) for link in links]
+    for link in links:
+        shuffled.links.remove(link)
+    for from_socket, to_socket in ends:
+        shuffled.links.new(from_socket, to_socket)
+    assert nudge(shuffled) == nudge(tree)
@@ -0,0 +1,42 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import pytest
+
+from square_noodles import core
+
+from .trees import dump, random_tree
+
+
+def plans(results):
+    return {key: plan.to_dict() for key, plan in results}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_plan_many_plans_like_one_at_a_time(monkeypatch, workers):
+    # with the threshold at 10 links, some of the trees go to the pool and the rest are planned here
+    monkeypatch.setattr(core, 'POOL_MIN_LINKS', 10)
+    trees = {seed: random_tree(seed, 5 + seed * 3) for seed in range(6)}
+    expected = {seed: core.plan_square_noodles(tree.nodes, tree.links, compact=True).to_dict()
+                for seed, tree in trees.items()}
+    results = list(core.plan_many(trees.items(), workers=workers, compact=True))
+    assert len(results) == len(trees)
+    assert plans(results) == expected
+
+
+def test_plan_many_leaves_the_trees_alone():
+    trees = [(seed, random_tree(seed, 30)) for seed in range(3)]
+    before = [dump(tree) for _, tree in trees]
+    list(core.plan_many(trees, workers=1))
+    assert [dump(tree) for _, tree in trees] == before
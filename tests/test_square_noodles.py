@@ -0,0 +1,150 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+import random
+
+import pytest
+
+from square_noodles import core, mock
+
+from .trees import dump, off_axis_links, random_tree, signals
+
+SETTINGS = [{'compact': compact, 'fan_out': fan_out} for compact in (False, True) for fan_out in (False, True)]
+
+
+def settings_id(settings):
+    return ','.join(f'{name}={value}' for name, value in settings.items())
+
+
+@pytest.mark.parametrize('settings', SETTINGS, ids=settings_id)
+@pytest.mark.parametrize('seed', range(25))
+def test_inputs_keep_their_signal(seed, settings):
+    tree = random_tree(seed, 20 + seed * 2)
+    before = signals(tree)
+    core.square_noodles(tree.nodes, tree.links, **settings)
+    assert signals(tree) == before
+
+
+@pytest.mark.parametrize('settings', SETTINGS, ids=settings_id)
+@pytest.mark.parametrize('seed', range(25))
+def test_selected_links_end_up_on_axis(seed, settings):
+    tree = random_tree(seed, 20 + seed * 2)
+    selected = {node.name for node in tree.nodes if node.select}
+    core.square_noodles(tree.nodes, tree.links, **settings)
+    assert off_axis_links(tree, selected) == []
+
+
+@pytest.mark.parametrize('settings', SETTINGS, ids=settings_id)
+@pytest.mark.parametrize('seed', range(10))
+def test_dry_run_leaves_tree_untouched(seed, settings):
+    tree, twin = random_tree(seed, 40), random_tree(seed, 40)
+    before = dump(tree)
+    plan = core.plan_square_noodles(tree.nodes, tree.links, **settings)
+    assert dump(tree) == before
+
+    # and it's the same plan square_noodles goes on to apply
+    applied = core.square_noodles(twin.nodes, twin.links, **settings)
+    assert plan.to_dict() == applied.to_dict()
+
+
+# Squaring a few selected nodes only snapshots the part of the tree around them (see snapshot_selection).
+# Squaring the same selection in a full copy of the tree has to make exactly the same changes, including
+# which reroutes already there get linked into, over several runs with things moved around in between.
+@pytest.mark.parametrize('settings', SETTINGS, ids=settings_id)
+@pytest.mark.parametrize('seed', range(80))
+def test_scoped_snapshot_plans_like_a_full_one(monkeypatch, seed, settings):
+    results = []
+    for scoped in (True, False):
+        if not scoped:
+            monkeypatch.setattr(core, 'snapshot_selection',
+                                lambda nodes, links, *args: mock.copy_tree(nodes, links))
+        tree, rng = random_tree(seed, 40 + seed % 60), random.Random(seed)
+        for run in range(3):
+            fraction = rng.choice([0.02, 0.1, 0.3])
+            for node in tree.nodes:
+                node.select = rng.random() < fraction
+            core.square_noodles(tree.nodes, tree.links, **settings)
+            for node in tree.nodes:
+                if rng.random() < 0.2:
+                    node.location = (node.location.x + rng.uniform(-40, 40), node.location.y + rng.uniform(-40, 40))
+        results.append(dump(tree))
+    assert results[0] == results[1]
+
+
+# A tree's links that count how many times they're gone through
+class CountingLinks:
+
+    def __init__(self, links):
+        self.links = links
+        self.passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        return iter(self.links)
+
+    def new(self, from_socket, to_socket):
+        return self.links.new(from_socket, to_socket)
+
+    def remove(self, link):
+        self.links.remove(link)
+
+
+# The operator finds the selection's scope once and plans and applies from it, so the tree's links are
+# only gone through once, and the changes are the same as without it
+@pytest.mark.parametrize('seed', range(10))
+def test_planning_and_applying_from_a_scope_reads_the_links_once(seed):
+    tree, twin = random_tree(seed, 60, selected=0.1), random_tree(seed, 60, selected=0.1)
+    links = CountingLinks(tree.links)
+    scope = core.SelectionScope(tree.nodes, links)
+    plan = core.plan_square_noodles(tree.nodes, links, compact=True, scope=scope)
+    if plan is not None:
+        core.apply_plan(plan, tree.nodes, links, scope=scope)
+    assert links.passes == 1
+
+    core.square_noodles(twin.nodes, twin.links, compact=True)
+    assert dump(tree) == dump(twin)
+
+
+# The one case that needs the snapshot to look past its own edges: the reroute to link into is nowhere
+# near the selection's links, and only gets the right signal through other reroutes that aren't either
+def test_scoped_snapshot_reuses_reroutes_fed_from_outside(monkeypatch):
+
+    def build():
+        tree = mock.MockTree()
+        source = tree.nodes.new('ShaderNodeMath', location=(0, 0))
+        source.add_output('Value')
+        target = tree.nodes.new('ShaderNodeMath', location=(600, -400), select=True)
+        target.add_input('Value')
+        tree.links.new(source.outputs[0], target.inputs[0])
+
+        # source -> far away -> right where the stairstep's last corner goes -> something else
+        link_index = core.LinkIndex(tree.links)
+        start = core.get_socket_dict(source, link_index)['output']['Value']
+        end = core.get_socket_dict(target, link_index)['input']['Value']
+        far = tree.nodes.new('NodeReroute', location=(start.x, 2000))
+        corner = tree.nodes.new('NodeReroute', location=((start.x + end.x) / 2, end.y))
+        other = tree.nodes.new('ShaderNodeMath', location=(3000, -3000))
+        other.add_input('Value')
+        tree.links.new(source.outputs[0], far.inputs[0])
+        tree.links.new(far.outputs[0], corner.inputs[0])
+        tree.links.new(corner.outputs[0], other.inputs[0])
+        return tree
+
+    tree = build()
+    scoped = core.plan_square_noodles(tree.nodes, tree.links)
+    monkeypatch.setattr(core, 'snapshot_selection', lambda nodes, links, *args: mock.copy_tree(nodes, links))
+    full = core.plan_square_noodles(tree.nodes, tree.links)
+    assert full.stats.counts['reroutes_reused'] == 1
+    assert scoped.to_dict() == full.to_dict()
+    assert scoped.stats.counts == full.stats.counts
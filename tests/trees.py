@@ -0,0 +1,92 @@
+######################################## LICENSE #################################################
+# This program is free software: you can redistribute it and/or modify it under the terms of the #
+# GNU General Public License as published by the Free Software Foundation, either version 3 of   #
+# the License, or (at your option) any later version.                                            #
+#                                                                                                #
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;      #
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.      #
+# See the GNU General Public License for more details.                                           #
+#                                                                                                #
+# You should have received a copy of the GNU General Public License along with this program. If  #
+# not, see <https://www.gnu.org/licenses/>.                                                      #
+##################################################################################################
+
+
+# Random node trees for the tests, and ways of looking at what squaring did to them
+
+import random
+
+from square_noodles import mock
+from square_noodles.core import LinkIndex, check_aligned, get_socket_dict
+
+
+# A tree of n nodes scattered over a 2000 x 1500 area, about a third of them reroutes and the rest Math
+# nodes of a few sizes (some collapsed, some with hidden inputs), with n * 1.3 random links between them.
+# Each node is selected with probability selected.
+def random_tree(seed, n=40, selected=0.6):
+    rng = random.Random(seed)
+    tree = mock.MockTree()
+    nodes = []
+    for i in range(n):
+        location = (rng.uniform(0, 2000), rng.uniform(-1500, 0))
+        if rng.random() < 0.3:
+            node = tree.nodes.new('NodeReroute', location=location)
+        else:
+            node = tree.nodes.new('ShaderNodeMath', location=location, node_type='MATH',
+                                  dimensions=(rng.choice([140, 160, 240]), rng.choice([100, 150, 300])),
+                                  hide=rng.random() < 0.25)
+            for j in range(rng.randint(1, 4)):
+                node.add_input(f'In{j}', type=rng.choice(['VALUE', 'VECTOR', 'RGBA']), hide=rng.random() < 0.1)
+            for j in range(rng.randint(1, 3)):
+                node.add_output(f'Out{j}', type=rng.choice(['VALUE', 'VECTOR']))
+        node.select = rng.random() < selected
+        nodes.append(node)
+    for _ in range(int(n * 1.3)):
+        a, b = rng.sample(nodes, 2)
+        if len(a.outputs) > 0 and len(b.inputs) > 0:
+            tree.links.new(rng.choice(a.outputs), rng.choice(b.inputs))
+    return tree
+
+
+# Everything squaring can change: where every node is and what's linked to what
+def dump(tree):
+    nodes = [(node.name, tuple(node.location)) for node in tree.nodes]
+    links = [(link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+             for link in tree.links]
+    return nodes, links
+
+
+# For every input of every node that isn't a reroute, the output its signal comes from once it's been
+# followed back through any reroutes (None if it runs out or goes round in a loop)
+def signals(tree):
+    feeds = {(link.to_node.name, link.to_socket.identifier): link for link in tree.links}
+    found = {}
+    for node in tree.nodes:
+        if node.bl_idname == 'NodeReroute':
+            continue
+        for socket in node.inputs:
+            link, seen = feeds.get((node.name, socket.identifier)), set()
+            while link is not None and link.from_node.bl_idname == 'NodeReroute' and link.from_node.name not in seen:
+                seen.add(link.from_node.name)
+                link = feeds.get((link.from_node.name, link.from_node.inputs[0].identifier))
+            if link is not None and link.from_node.bl_idname == 'NodeReroute':
+                link = None
+            found[node.name, socket.identifier] = \
+                None if link is None else (link.from_node.name, link.from_socket.identifier)
+    return found
+
+
+# The links with an end at one of the named nodes that are neither level nor vertical, leaving out any to
+# a socket that isn't drawn (and so has no position)
+def off_axis_links(tree, names, tolerance=5.0):
+    link_index = LinkIndex(tree.links)
+    sockets = {node.name: get_socket_dict(node, link_index) for node in tree.nodes}
+    off_axis = []
+    for link in tree.links:
+        if link.from_node.name not in names and link.to_node.name not in names:
+            continue
+        start = sockets[link.from_node.name]['output'].get(link.from_socket.identifier)
+        end = sockets[link.to_node.name]['input'].get(link.to_socket.identifier)
+        if start is not None and end is not None and not check_aligned(start, end, tolerance):
+            off_axis.append(link)
+    return off_axis